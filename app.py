@@ -1,18 +1,177 @@
-from flask import Flask, request, render_template, redirect, url_for
+from flask import (
+    Flask, Response, g, has_request_context, request, render_template, redirect, url_for, jsonify,
+    stream_template, stream_with_context
+)
+import contextlib
+import csv
+import io
 import math
 import json
 import os
-from datetime import datetime, timedelta
+import fcntl
+import hashlib
+import shutil
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, insert, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError
 import numpy as np
-from scipy.optimize import linear_sum_assignment
 
 # ======================= הגדרות אפליקציה ו-DB =======================
-app = Flask(__name__)
+app = Flask(__name__, instance_path=os.environ.get("FOODI_INSTANCE_PATH"))   # DB + קטלוג
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///foodi.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
 
+# WAL + busy_timeout: כמה workers של gunicorn כותבים לאותו קובץ SQLite במקביל
+@event.listens_for(Engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _record):
+    if isinstance(dbapi_conn, sqlite3.Connection):
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA busy_timeout=5000")
+        cur.close()
+
+# ======================= מדידה: Server-Timing + /metrics =======================
+METRICS_ENABLED = os.environ.get("FOODI_METRICS", "1") != "0"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+_NULL_STAGE = contextlib.nullcontext()
+
+class Metrics:
+    """היסטוגרמות זמן לכל route, זמני שלבים ומונים – לכל תהליך (worker) בנפרד."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}    # route -> [count לכל bucket..., +Inf]
+        self.latency_sum = {}
+        self.stages = {}     # (route, stage) -> [sum, count]
+        self.counters = {}   # (name, labels) -> value
+        self.collectors = [] # פונקציות שמחזירות שורות נוספות (מטמונים וכו')
+
+    def observe_request(self, route, seconds, stages, counts):
+        with self.lock:
+            buckets = self.latency.get(route)
+            if buckets is None:
+                buckets = self.latency[route] = [0] * (len(LATENCY_BUCKETS) + 1)
+                self.latency_sum[route] = 0.0
+            for i, le in enumerate(LATENCY_BUCKETS):
+                if seconds <= le:
+                    buckets[i] += 1
+            buckets[-1] += 1
+            self.latency_sum[route] += seconds
+            for name, dur in stages.items():
+                st = self.stages.setdefault((route, name), [0.0, 0])
+                st[0] += dur
+                st[1] += 1
+            for name, n in counts.items():
+                self.inc(name, n, route=route, _locked=True)
+
+    def inc(self, name, n=1, _locked=False, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        if _locked:
+            self.counters[key] = self.counters.get(key, 0) + n
+            return
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def render(self):
+        pid = os.getpid()
+        out = [
+            "# HELP foodi_request_duration_seconds Request latency per route.",
+            "# TYPE foodi_request_duration_seconds histogram",
+        ]
+        with self.lock:
+            for route, buckets in sorted(self.latency.items()):
+                for le, n in zip(LATENCY_BUCKETS, buckets):
+                    out.append(f'foodi_request_duration_seconds_bucket{{route="{route}",le="{le}",pid="{pid}"}} {n}')
+                out.append(f'foodi_request_duration_seconds_bucket{{route="{route}",le="+Inf",pid="{pid}"}} {buckets[-1]}')
+                out.append(f'foodi_request_duration_seconds_sum{{route="{route}",pid="{pid}"}} {self.latency_sum[route]:.6f}')
+                out.append(f'foodi_request_duration_seconds_count{{route="{route}",pid="{pid}"}} {buckets[-1]}')
+
+            out.append("# HELP foodi_stage_duration_seconds Time spent per request stage.")
+            out.append("# TYPE foodi_stage_duration_seconds summary")
+            for (route, name), (total, n) in sorted(self.stages.items()):
+                out.append(f'foodi_stage_duration_seconds_sum{{route="{route}",stage="{name}",pid="{pid}"}} {total:.6f}')
+                out.append(f'foodi_stage_duration_seconds_count{{route="{route}",stage="{name}",pid="{pid}"}} {n}')
+
+            seen = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in seen:
+                    out.append(f"# TYPE foodi_{name}_total counter")
+                    seen.add(name)
+                lbl = ",".join(f'{k}="{v}"' for k, v in labels + (("pid", pid),))
+                out.append(f"foodi_{name}_total{{{lbl}}} {value}")
+        for collect in self.collectors:
+            out.extend(collect())
+        return "\n".join(out) + "\n"
+
+metrics = Metrics()
+
+class _Stage:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        stages = g.foodi_stages
+        stages[self.name] = stages.get(self.name, 0.0) + time.perf_counter() - self.t0
+
+def stage(name):
+    """with stage("rank"): ... – זמן שלב בבקשה הנוכחית (nullcontext כשהמדידה כבויה)."""
+    if not METRICS_ENABLED or not has_request_context() or "foodi_stages" not in g:
+        return _NULL_STAGE
+    return _Stage(name)
+
+def count(name, n=1):
+    """מונה לבקשה הנוכחית (למשל קריאות ממאגר הדיווחים)."""
+    if METRICS_ENABLED and has_request_context() and "foodi_counts" in g:
+        g.foodi_counts[name] = g.foodi_counts.get(name, 0) + n
+
+def _sql_before(conn, cursor, statement, params, context, executemany):
+    # על ה-context של הפקודה: פקודה שנכשלה לא מגיעה ל-after ולא משאירה שארית
+    if context is not None:
+        context.foodi_t0 = time.perf_counter()
+
+def _sql_after(conn, cursor, statement, params, context, executemany):
+    t0 = getattr(context, "foodi_t0", None)
+    if t0 is not None and has_request_context() and "foodi_stages" in g:
+        g.foodi_stages["db"] = g.foodi_stages.get("db", 0.0) + time.perf_counter() - t0
+        g.foodi_counts["db_queries"] = g.foodi_counts.get("db_queries", 0) + 1
+
+if METRICS_ENABLED:
+    event.listen(Engine, "before_cursor_execute", _sql_before)
+    event.listen(Engine, "after_cursor_execute", _sql_after)
+
+    @app.before_request
+    def _metrics_start():
+        g.foodi_t0 = time.perf_counter()
+        g.foodi_stages = {}
+        g.foodi_counts = {}
+
+    @app.after_request
+    def _metrics_finish(response):
+        if "foodi_t0" not in g:
+            return response
+        total = time.perf_counter() - g.foodi_t0
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        timing = [f"total;dur={total * 1e3:.2f}"]
+        timing += [f"{name};dur={dur * 1e3:.2f}" for name, dur in g.foodi_stages.items()]
+        timing += [f'{name};desc="{n}"' for name, n in g.foodi_counts.items()]
+        response.headers["Server-Timing"] = ", ".join(timing)
+        metrics.observe_request(route, total, g.foodi_stages, g.foodi_counts)
+        return response
+
 # ======================= מודל מסעדות בבסיס הנתונים =======================
 class Restaurant(db.Model):
     __tablename__ = 'restaurants'
@@ -38,6 +197,38 @@ class Restaurant(db.Model):
             "wait_time": self.wait_time
         }
 
+# ======================= מודל דיווחי עומס =======================
+class Report(db.Model):
+    __tablename__ = 'reports'
+    __table_args__ = (
+        # "דיווחים למסעדה X מאז T" = סריקת טווח על האינדקס
+        db.Index('ix_reports_restaurant_time', 'restaurant_id', 'created_at'),
+        {'sqlite_autoincrement': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    wait_minutes = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "restaurant_id": self.restaurant_id,
+            "wait_minutes": self.wait_minutes,
+            "created_at": self.created_at.isoformat()
+        }
+
+class ReportAggregate(db.Model):
+    """דיווחים ישנים שנדחסו: לכל מסעדה ושעה-בשבוע (0 = שני 00:00 UTC)."""
+    __tablename__ = 'report_aggregates'
+
+    restaurant_id = db.Column(db.Integer, primary_key=True)
+    hour_of_week = db.Column(db.Integer, primary_key=True)
+    n_reports = db.Column(db.Integer, nullable=False, default=0)
+    wait_sum = db.Column(db.Float, nullable=False, default=0.0)
+    wait_sumsq = db.Column(db.Float, nullable=False, default=0.0)
+
 # ======================= אחידות סוגים (נרמול) =======================
 TYPE_CANONICAL = {
     # אסייתי
@@ -79,13 +270,14 @@ def normalize_type(s: str) -> str:
     return TYPE_CANONICAL.get(s, s)
 
 def cleanup_types_in_db():
-    """מתקן ערכי type שכבר קיימים במסד (בלי למחוק DB)."""
-    changed = 0
-    for r in Restaurant.query.all():
-        new_t = normalize_type(r.type)
-        if r.type != new_t:
-            r.type = new_t
-            changed += 1
+    """מתקן ערכי type שכבר קיימים במסד (בלי למחוק DB) – פקודת UPDATE אחת."""
+    trimmed = db.func.trim(Restaurant.type)
+    new_t = db.case(TYPE_CANONICAL, value=trimmed, else_=trimmed)
+    changed = (
+        Restaurant.query
+        .filter(Restaurant.type.isnot(None), Restaurant.type != new_t)
+        .update({Restaurant.type: new_t}, synchronize_session=False)
+    )
     db.session.commit()
     print(f"[cleanup_types_in_db] updated {changed} rows")
 
@@ -204,17 +396,24 @@ def seed_restaurants():
     ]
 
     
-    for item in data:
-       if Restaurant.query.filter_by(name=item["name"]).first():
-          continue
-
-       db.session.add(Restaurant(
-         name=item["name"],
-         type=normalize_type(item.get("type")),
-         lat=item.get("lat"),
-         lon=item.get("lon"),
-    ))
-
+    names = [item["name"] for item in data]
+    existing = {
+        name for (name,) in
+        db.session.query(Restaurant.name).filter(Restaurant.name.in_(names))
+    }
+    missing = [
+        {
+            "name": item["name"],
+            "type": normalize_type(item.get("type")),
+            "lat": item.get("lat"),
+            "lon": item.get("lon"),
+            "available": True,
+            "wait_time": 0,
+        }
+        for item in data if item["name"] not in existing
+    ]
+    if missing:
+        db.session.execute(insert(Restaurant), missing)
     db.session.commit()
 
 
@@ -236,18 +435,246 @@ def _load(path, default):
 def _save(path, obj):
     json.dump(obj, open(path, "w", encoding="utf-8"), ensure_ascii=False, indent=2)
 
-def load_restaurants():
-    return [r.to_dict() for r in Restaurant.query.filter_by(available=True).all()]
+# ======================= קטלוג מסעדות משותף (snapshot עמודתי) =======================
+CATALOG_DIR = os.path.join(app.instance_path, "catalog")
+CATALOG_KEEP = 2   # כמה גרסאות ישנות להשאיר לדיסק (workers שעוד ממפים אותן)
 
-def load_reports():
-    return _load(REPORTS, [])
+class CatalogSnapshot:
+    """קטלוג המסעדות כעמודות .npy ממופות לזיכרון (mmap) – משותף לכל ה-workers.
+
+    הגרסה עולה רק כשהקטלוג עצמו משתנה (הוספת מסעדה). wait_time ממופה לכתיבה,
+    כך שדיווח מעדכן אותו במקום וכל ה-workers רואים את הערך בלי גרסה חדשה.
+    """
 
-def save_reports(x):
-    _save(REPORTS, x)
+    COLUMNS = ("id", "name", "type", "lat", "lon", "contact", "available", "wait_time")
+
+    def __init__(self, version, path):
+        self.version = version
+        self.path = path
+        for col in self.COLUMNS:
+            setattr(self, col, self._map(col, "r+" if col == "wait_time" else "r"))
+        self._rows = None
+        self._name_ids = None
+
+    def _map(self, col, mode):
+        f = os.path.join(self.path, col + ".npy")
+        try:
+            return np.load(f, mmap_mode=mode)
+        except ValueError:
+            return np.load(f)   # עמודה ריקה – אי אפשר למפות 0 בתים
+
+    def __len__(self):
+        return len(self.id)
+
+    def position(self, rid):
+        pos = int(np.searchsorted(self.id, rid))
+        if pos < len(self.id) and self.id[pos] == rid:
+            return pos
+        return None
+
+    def rows(self):
+        """המסעדות הזמינות כ-dict (כמו Restaurant.to_dict); נבנה פעם אחת לגרסה.
+
+        wait_time בשורות הוא הערך בזמן הבנייה – הערך החי נמצא ב-self.wait_time.
+        """
+        if self._rows is None:
+            cols = [getattr(self, c).tolist() for c in self.COLUMNS]
+            rows = []
+            for rid, name, type_, lat, lon, contact, available, wait in zip(*cols):
+                if not available:
+                    continue
+                rows.append({
+                    "id": rid,
+                    "name": name,
+                    "type": type_,
+                    "lat": None if lat != lat else lat,
+                    "lon": None if lon != lon else lon,
+                    "contact": contact,
+                    "available": available,
+                    "wait_time": wait
+                })
+            self._rows = rows
+        return self._rows
+
+    def positions(self, rids):
+        """מיקומים לכל id (או -1 אם לא קיים) – וקטורי."""
+        rids = np.asarray(rids, dtype=np.int64)
+        pos = np.searchsorted(self.id, rids)
+        pos[pos >= len(self.id)] = 0
+        hit = (len(self.id) > 0) & (self.id[pos] == rids) if len(self.id) else np.zeros(len(rids), bool)
+        return np.where(hit, pos, -1)
+
+    def name_ids(self):
+        """שם (casefold) -> id, כמו ilike על שם מלא; נבנה פעם אחת לגרסה."""
+        if self._name_ids is None:
+            self._name_ids = {n.casefold(): i for n, i in zip(self.name.tolist(), self.id.tolist())}
+        return self._name_ids
+
+def _catalog_version_file():
+    return os.path.join(CATALOG_DIR, "VERSION")
+
+def write_catalog_snapshot():
+    """כותב גרסה חדשה של הקטלוג מה-DB ומקדם את מונה הגרסה (תחת נעילת קובץ)."""
+    os.makedirs(CATALOG_DIR, exist_ok=True)
+    with open(os.path.join(CATALOG_DIR, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(_catalog_version_file()) as f:
+                version = int(f.read().strip() or 0) + 1
+        except FileNotFoundError:
+            version = 1
+
+        rows = (
+            db.session.query(
+                Restaurant.id, Restaurant.name, Restaurant.type, Restaurant.lat, Restaurant.lon,
+                Restaurant.contact, Restaurant.available, Restaurant.wait_time
+            )
+            .order_by(Restaurant.id)
+            .all()
+        )
+        ids, names, types, lats, lons, contacts, avail, waits = zip(*rows) if rows else [()] * 8
+        columns = {
+            "id": np.array(ids, dtype=np.int64),
+            "name": np.array(names, dtype=str),
+            "type": np.array([normalize_type(t) for t in types], dtype=str),
+            "lat": np.array([np.nan if v is None else v for v in lats], dtype=np.float64),
+            "lon": np.array([np.nan if v is None else v for v in lons], dtype=np.float64),
+            "contact": np.array([c or "" for c in contacts], dtype=str),
+            "available": np.array([a is not False for a in avail], dtype=bool),
+            "wait_time": np.array([w or 0 for w in waits], dtype=np.int32),
+        }
+
+        tmp = os.path.join(CATALOG_DIR, f".v{version}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for col, arr in columns.items():
+            np.save(os.path.join(tmp, col + ".npy"), arr)
+        os.rename(tmp, os.path.join(CATALOG_DIR, f"v{version}"))
+
+        with open(_catalog_version_file() + ".tmp", "w") as f:
+            f.write(str(version))
+        os.replace(_catalog_version_file() + ".tmp", _catalog_version_file())
+
+        # ב-Linux מחיקת קובץ ממופה בטוחה – workers ישנים ממשיכים לקרוא עד שיטענו מחדש
+        for old in range(max(version - CATALOG_KEEP - 5, 1), version - CATALOG_KEEP + 1):
+            shutil.rmtree(os.path.join(CATALOG_DIR, f"v{old}"), ignore_errors=True)
+    return version
+
+_catalog = None
+_catalog_stamp = None
+
+def get_catalog():
+    """ה-snapshot הנוכחי; נטען מחדש רק כשקובץ הגרסה מתחלף."""
+    global _catalog, _catalog_stamp
+    try:
+        st = os.stat(_catalog_version_file())
+    except FileNotFoundError:
+        write_catalog_snapshot()
+        st = os.stat(_catalog_version_file())
+    stamp = (st.st_ino, st.st_mtime_ns)
+    if _catalog is None or stamp != _catalog_stamp:
+        with open(_catalog_version_file()) as f:
+            version = int(f.read().strip())
+        _catalog = CatalogSnapshot(version, os.path.join(CATALOG_DIR, f"v{version}"))
+        _catalog_stamp = stamp
+    return _catalog
+
+def catalog_set_wait(rid, wait):
+    """מעדכן wait_time במקום ב-snapshot הממופה (נראה מיד בכל ה-workers)."""
+    snap = get_catalog()
+    pos = snap.position(rid)
+    if pos is not None:
+        snap.wait_time[pos] = wait
+
+def catalog_set_waits(rids, waits):
+    """כמו catalog_set_wait, למערך מסעדות בבת אחת."""
+    snap = get_catalog()
+    pos = snap.positions(rids)
+    hit = pos >= 0
+    snap.wait_time[pos[hit]] = np.asarray(waits, dtype=np.int32)[hit]
+
+def load_restaurants():
+    return get_catalog().rows()
 
 def now_utc():
     return datetime.utcnow()
 
+# ======================= מאגר דיווחים =======================
+_report_store_ready = False
+
+def migrate_reports_json():
+    """העברה חד-פעמית של reports.json לטבלת reports."""
+    claimed = REPORTS + ".migrating"
+    try:
+        os.rename(REPORTS, claimed)   # אטומי – רק worker אחד זוכה בהעברה
+    except FileNotFoundError:
+        return 0
+
+    # ה-id מה-JSON לא נשמר: השיטה הישנה (len(reports)+1) יצרה כפילויות.
+    # autoincrement לפי סדר הזמנים; שורה פגומה מדולגת ולא חוסמת את ההעברה
+    rows = []
+    for r in _load(claimed, []):
+        try:
+            rows.append({
+                "restaurant_id": int(r["restaurant_id"]),
+                "wait_minutes": int(r["wait_minutes"]),
+                "created_at": datetime.fromisoformat(r["created_at"]),
+            })
+        except (KeyError, TypeError, ValueError):
+            continue
+    rows.sort(key=lambda r: r["created_at"])
+    try:
+        if rows:
+            db.session.execute(Report.__table__.insert(), rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        os.rename(claimed, REPORTS)
+        raise
+
+    os.rename(claimed, REPORTS + ".migrated")
+    print(f"[migrate_reports_json] migrated {len(rows)} reports")
+    return len(rows)
+
+def init_report_store():
+    global _report_store_ready
+    if _report_store_ready:
+        return
+    for table in (Report.__table__, ReportAggregate.__table__):
+        try:
+            table.create(bind=db.engine, checkfirst=True)
+        except OperationalError:
+            pass   # worker אחר יצר את הטבלה באותו רגע
+    migrate_reports_json()
+    _report_store_ready = True
+
+def append_report(restaurant_id, wait_minutes, created_at=None):
+    """מוסיף דיווח לסשן; ה-commit נעשה יחד עם שאר השינויים של הבקשה."""
+    init_report_store()
+    rep = Report(
+        restaurant_id=restaurant_id,
+        wait_minutes=wait_minutes,
+        created_at=created_at or now_utc()
+    )
+    db.session.add(rep)
+    return rep
+
+def load_reports():
+    init_report_store()
+    count("report_reads")
+    return [r.to_dict() for r in Report.query.order_by(Report.id).all()]
+
+def reports_since(rid, since):
+    init_report_store()
+    count("report_reads")
+    rows = (
+        Report.query
+        .filter(Report.restaurant_id == rid, Report.created_at >= since)
+        .order_by(Report.created_at)
+        .all()
+    )
+    return [r.to_dict() for r in rows]
+
 # ======================= Utils =======================
 def haversine(lat1, lon1, lat2, lon2):
     R = 6371.0
@@ -257,43 +684,439 @@ def haversine(lat1, lon1, lat2, lon2):
     return 2 * R * math.asin(math.sqrt(a))
 
 MAX_DISTANCE = 10.0   # ק"מ – מרחק עירוני סביר
+MAX_SEARCH_RADIUS = 50.0   # ק"מ – רדיוס מקסימלי שמשתמש יכול לבקש ב-/find
 MAX_WAIT = 60.0       # דקות – זמן המתנה מקסימלי
+DISTANCE_WEIGHT = 0.7 # העדפה למרחק
+WAIT_WEIGHT = 0.3     # העדפה לזמן המתנה
+EARTH_RADIUS_KM = 6371.0
+
+def unit_vectors(lats, lons):
+    """קואורדינטות (במעלות) לוקטורי יחידה תלת-ממדיים – מערך (N, 3) רציף."""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.ascontiguousarray(np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=1))
+
+def dot_to_chord_km(dot):
+    """מכפלה סקלרית של וקטורי יחידה -> מרחק מיתר בק"מ (במקום, על אותו מערך)."""
+    np.multiply(dot, -2.0, out=dot)
+    dot += 2.0
+    np.maximum(dot, 0.0, out=dot)
+    np.sqrt(dot, out=dot)
+    dot *= EARTH_RADIUS_KM
+    return dot
+
+class RankingEngine:
+    """קואורדינטות וזמני המתנה כמערכים רציפים; עלות לכל המועמדים בפעולה וקטורית אחת.
+
+    לדירוג משתמשים במרחק מיתר (R * |p - q|) – מכפלה סקלרית אחת לכל מסעדה, בלי
+    פונקציות טריגונומטריות. בטווח עירוני ההפרש מ-haversine זניח (< 1 מ' ב-100 ק"מ);
+    המרחקים המוצגים ל-k הנבחרות מחושבים מחדש ב-haversine מדויק.
+    """
+
+    def __init__(self, lats, lons, waits):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.xyz = unit_vectors(self.lats, self.lons)
+        self.wait = np.asarray(waits, dtype=np.float64)
+
+    @classmethod
+    def from_restaurants(cls, restaurants):
+        waits = [
+            r["predicted_wait"] if "predicted_wait" in r else weighted_prediction_for_restaurant(r)[0]
+            for r in restaurants
+        ]
+        return cls([r["lat"] for r in restaurants], [r["lon"] for r in restaurants], waits)
+
+    def __len__(self):
+        return len(self.wait)
+
+    def chord_km(self, lat, lon, idx=None):
+        lat_r, lon_r = math.radians(lat), math.radians(lon)
+        q = np.array([math.cos(lat_r) * math.cos(lon_r), math.cos(lat_r) * math.sin(lon_r), math.sin(lat_r)])
+        xyz = self.xyz if idx is None else self.xyz[idx]
+        return dot_to_chord_km(xyz @ q)
+
+    def distances(self, lat, lon, idx):
+        return np.array([haversine(lat, lon, self.lats[i], self.lons[i]) for i in idx])
+
+    def costs(self, dist, wait, distance_weight=DISTANCE_WEIGHT, wait_weight=WAIT_WEIGHT):
+        """עלות נרמלית; dist נדרס במקום (מערך זמני של הקורא)."""
+        dist *= distance_weight / MAX_DISTANCE
+        dist += wait * (wait_weight / MAX_WAIT)
+        return dist
+
+    def top_k(self, lat, lon, k=5, distance_weight=DISTANCE_WEIGHT, wait_weight=WAIT_WEIGHT, idx=None, wait=None):
+        """מחזיר (אינדקסים, מרחקים מדויקים) של k הזולים ביותר, ממוינים לפי עלות.
+
+        idx – תת-קבוצת מועמדים (למשל מהאינדקס המרחבי); wait – זמני המתנה
+        תואמים ל-idx במקום self.wait.
+        """
+        if idx is None:
+            idx = np.arange(len(self))
+            cost = self.costs(self.chord_km(lat, lon), self.wait if wait is None else wait,
+                              distance_weight, wait_weight)
+        else:
+            cost = self.costs(self.chord_km(lat, lon, idx), self.wait[idx] if wait is None else wait,
+                              distance_weight, wait_weight)
+        if len(idx) == 0 or k <= 0:
+            return idx[:0], np.empty(0)
+        k = min(k, len(idx))
+        part = np.argpartition(cost, k - 1)[:k] if k < len(idx) else np.arange(len(idx))
+        # שוויון בעלות – לפי סדר הרשימה, כמו argmin חוזר
+        order = part[np.lexsort((part, cost[part]))]
+        best = idx[order]
+        return best, self.distances(lat, lon, best)
+
+# ======================= אינדקס מרחבי =======================
+SPATIAL_CELL_DEG = 0.01   # ~1.1 ק"מ לתא
+
+class SpatialIndex:
+    """רשת תאים (lat/lon מכומתים) -> מיקומי מסעדות, בנפרד לכל סוג מטבח.
+
+    שאילתת רדיוס עוברת רק על התאים שחופפים לריבוע החוסם ומסננת במרחק
+    מדויק את המועמדים שבהם – העלות תלויה במספר המסעדות הקרובות ולא בגודל הקטלוג.
+    """
+
+    def __init__(self, restaurants=(), cell_deg=SPATIAL_CELL_DEG, version=None):
+        self.cell = cell_deg
+        self.version = version   # גרסת הקטלוג שממנה נבנה האינדקס
+        self.restaurants = []
+        self.cells = {}        # (cuisine, ci, cj) -> [pos]; cuisine "" = כל הסוגים
+        self._engine = None
+        for r in restaurants:
+            self.insert(r)
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.cell)), int(math.floor(lon / self.cell))
+
+    def insert(self, r):
+        if r.get("lat") is None or r.get("lon") is None or not r.get("available", True):
+            return
+        pos = len(self.restaurants)
+        self.restaurants.append(r)
+        ci, cj = self._cell(r["lat"], r["lon"])
+        self.cells.setdefault(("", ci, cj), []).append(pos)
+        cuisine = normalize_type(r.get("type"))
+        if cuisine:
+            self.cells.setdefault((cuisine, ci, cj), []).append(pos)
+        self._engine = None   # המערכים ייבנו מחדש בשאילתה הבאה
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = RankingEngine(
+                [r["lat"] for r in self.restaurants],
+                [r["lon"] for r in self.restaurants],
+                np.zeros(len(self.restaurants))
+            )
+            self._engine.ids = np.array([r["id"] for r in self.restaurants], dtype=np.int64)
+        return self._engine
+
+    @property
+    def ids(self):
+        return self.engine.ids
+
+    def positions(self, cuisine=""):
+        """כל מיקומי המסעדות מהסוג המבוקש (ללא סינון מרחק)."""
+        if not cuisine:
+            return np.arange(len(self.restaurants), dtype=np.intp)
+        found = [p for (c, _ci, _cj), bucket in self.cells.items() if c == cuisine for p in bucket]
+        return np.sort(np.array(found, dtype=np.intp))
+
+    def query(self, lat, lon, radius_km=MAX_DISTANCE, cuisine=""):
+        """מיקומי המסעדות (מהסוג המבוקש) בתוך הרדיוס, ממוינים."""
+        engine = self.engine
+        radius_km = min(radius_km, MAX_SEARCH_RADIUS)
+        dlat = radius_km / 111.32
+        dlon = radius_km / (111.32 * max(math.cos(math.radians(lat)), 0.01))
+        ci0, cj0 = self._cell(lat - dlat, lon - dlon)
+        ci1, cj1 = self._cell(lat + dlat, lon + dlon)
+        key = cuisine or ""
+        found = []
+        if (ci1 - ci0 + 1) * (cj1 - cj0 + 1) > len(self.cells):
+            # ריבוע חוסם עם יותר תאים ממה שיש באינדקס – עוברים על התאים התפוסים
+            for (c, ci, cj), bucket in self.cells.items():
+                if c == key and ci0 <= ci <= ci1 and cj0 <= cj <= cj1:
+                    found.extend(bucket)
+        else:
+            for ci in range(ci0, ci1 + 1):
+                for cj in range(cj0, cj1 + 1):
+                    bucket = self.cells.get((key, ci, cj))
+                    if bucket:
+                        found.extend(bucket)
+        if not found:
+            return np.empty(0, dtype=np.intp)
+        cand = np.sort(np.array(found, dtype=np.intp))
+        return cand[engine.chord_km(lat, lon, cand) <= radius_km]
+
+_spatial_index = None
+
+def get_spatial_index():
+    global _spatial_index
+    snap = get_catalog()
+    if _spatial_index is None or _spatial_index.version != snap.version:
+        _spatial_index = SpatialIndex(snap.rows(), version=snap.version)
+    return _spatial_index
+
+def spatial_index_insert(rest, version):
+    """שומר על האינדקס מעודכן אחרי הוספת מסעדה (ניהול / דיווח).
+
+    אם זה השינוי היחיד מאז שהאינדקס נבנה – מוסיפים במקום לבנות מחדש.
+    """
+    if _spatial_index is not None and _spatial_index.version == version - 1:
+        _spatial_index.insert(rest)
+        _spatial_index.version = version
+
+# ======================= אינדקס שמות (חיפוש מטושטש) =======================
+# כינויים ברמת מילה, בסגנון TYPE_CANONICAL ("" = מילת רעש שנזרקת)
+NAME_ALIASES = {
+    "מסעדת": "", "מסעדה": "", "restaurant": "", "the": "",
+    "קפה": "cafe", "cafe": "cafe", "coffee": "cafe",
+    "פיצה": "pizza", "פיצריה": "pizza", "pizzeria": "pizza", "pizza": "pizza",
+    "בורגר": "burger", "המבורגר": "burger", "burger": "burger", "hamburger": "burger",
+    "סושי": "sushi", "sushi": "sushi",
+    "בר": "bar", "bar": "bar",
+    "גריל": "grill", "grill": "grill",
+    "ירושלים": "jerusalem", "jerusalem": "jerusalem",
+}
+_HEBREW_FINALS = str.maketrans("ךםןףץ", "כמנפצ")
+SUGGEST_MIN_SIMILARITY = 0.3
+
+def _name_tokens(s):
+    """מילים אחרי הסרת ניקוד/סימנים ואחידות אותיות סופיות (לפני כינויים)."""
+    s = unicodedata.normalize("NFKD", s or "")
+    chars = []
+    for ch in s:
+        cat = unicodedata.category(ch)
+        if cat.startswith("M"):
+            continue                       # ניקוד, טעמים, accents
+        chars.append(" " if cat[0] in "PSZC" else ch)
+    return "".join(chars).casefold().translate(_HEBREW_FINALS).split()
+
+def normalize_name(s):
+    """שם -> צורה קנונית: בלי ניקוד/סימנים, אותיות סופיות רגילות, כינויים אחידים."""
+    tokens = [NAME_ALIASES.get(t, t) for t in _name_tokens(s)]
+    return " ".join(t for t in tokens if t)
+
+def _trigrams(norm):
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class NameIndex:
+    """אינדקס שמות בזיכרון: התאמה מדויקת, קידומת (של השם או של כל מילה) ודמיון טריגרמות."""
+
+    def __init__(self, rows=(), version=None):
+        self.version = version
+        self.entries = []    # (id, name, type, available)
+        self.exact = {}      # norm -> pos
+        self.prefixes = []   # ממוין: (מחרוזת, pos)
+        self.grams = {}      # trigram -> [pos]
+        self.n_grams = []
+        for r in rows:
+            self.insert(r, _sort=False)
+        self.prefixes.sort()
+
+    def insert(self, r, _sort=True):
+        pos = len(self.entries)
+        self.entries.append((r["id"], r["name"], r.get("type") or "", r.get("available", True)))
+        norm = normalize_name(r["name"])
+        self.exact.setdefault(norm, pos)
+        # קידומת: השם המנורמל, כל מילה שלו, וגם המילים המקוריות ("פיצ" -> "פיצה")
+        keys = {norm} | set(norm.split()) | set(_name_tokens(r["name"]))
+        for key in keys:
+            if _sort:
+                self.prefixes.insert(bisect_left(self.prefixes, (key, pos)), (key, pos))
+            else:
+                self.prefixes.append((key, pos))
+        grams = _trigrams(norm)
+        for gram in grams:
+            self.grams.setdefault(gram, []).append(pos)
+        self.n_grams.append(len(grams))
+
+    def _prefix(self, norm, limit):
+        found = []
+        i = bisect_left(self.prefixes, (norm, -1))
+        while i < len(self.prefixes) and len(found) < limit * 4:
+            key, pos = self.prefixes[i]
+            if not key.startswith(norm):
+                break
+            if pos not in found:
+                found.append(pos)
+            i += 1
+        return found
+
+    def _similar(self, norm):
+        """[(דמיון Jaccard, pos)] לכל שם שחולק טריגרמה עם השאילתה."""
+        grams = _trigrams(norm)
+        common = {}
+        for gram in grams:
+            for pos in self.grams.get(gram, ()):
+                common[pos] = common.get(pos, 0) + 1
+        return [(n / (len(grams) + self.n_grams[pos] - n), pos) for pos, n in common.items()]
+
+    def resolve(self, name):
+        """id של מסעדה קיימת לשם שהוזן – רק התאמה מדויקת אחרי נרמול, אחרת None.
+
+        בלי דמיון טריגרמות: "Burger Bar 2" הוא לא "Burger Bar", ודיווח ששויך
+        למסעדה הלא נכונה מקלקל את התחזיות שלה. השלמה בדמיון – רק ב-suggest.
+        """
+        norm = normalize_name(name)
+        if not norm:
+            return None
+        pos = self.exact.get(norm)
+        return None if pos is None else self.entries[pos][0]
+
+    def suggest(self, q, limit=8):
+        norm = normalize_name(q)
+        if not norm:
+            return []
+        raw = " ".join(_name_tokens(q))
+        out, seen = [], set()
+
+        def add(pos, score):
+            rid, name, type_, available = self.entries[pos]
+            if pos in seen or not available:
+                return
+            seen.add(pos)
+            out.append({"id": rid, "name": name, "type": type_, "score": round(score, 3)})
+
+        for key in dict.fromkeys((norm, raw)):
+            for pos in self._prefix(key, limit):
+                add(pos, 1.0)
+                if len(out) >= limit:
+                    return out
+        for score, pos in sorted(self._similar(norm), key=lambda x: (-x[0], x[1])):
+            if score < SUGGEST_MIN_SIMILARITY or len(out) >= limit:
+                break
+            add(pos, score)
+        return out
+
+_name_index = None
+
+def get_name_index():
+    global _name_index
+    snap = get_catalog()
+    if _name_index is None or _name_index.version != snap.version:
+        rows = [
+            {"id": i, "name": n, "type": t, "available": a}
+            for i, n, t, a in zip(snap.id.tolist(), snap.name.tolist(), snap.type.tolist(), snap.available.tolist())
+        ]
+        _name_index = NameIndex(rows, version=snap.version)
+    return _name_index
+
+def catalog_inserted(rest):
+    """אחרי הוספת מסעדה ל-DB: גרסת קטלוג חדשה + עדכון האינדקסים המקומיים במקום."""
+    version = write_catalog_snapshot()
+    spatial_index_insert(rest, version)
+    if _name_index is not None and _name_index.version == version - 1:
+        _name_index.insert(rest)
+        _name_index.version = version
+    return version
 
 def hungarian_top_k_restaurants_for_client(
     client_lat,
     client_lon,
     restaurants,
     k=5,
-    distance_weight=3.0,
-    wait_weight=1.0
+    distance_weight=DISTANCE_WEIGHT,
+    wait_weight=WAIT_WEIGHT
 ):
-    remaining = restaurants.copy()
-    ranked = []
-
-    for _ in range(min(k, len(remaining))):
-        cost_matrix = np.zeros((1, len(remaining)))
-
-        for j, r in enumerate(remaining):
-            d = haversine(client_lat, client_lon, r["lat"], r["lon"])
-            wait, _ = weighted_prediction_for_restaurant(r)
-
-            distance_norm = d / MAX_DISTANCE
-            wait_norm = wait / MAX_WAIT
-
-            cost_matrix[0, j] = (
-            0.7 * distance_norm +   # העדפה למרחק
-            0.3 * wait_norm)
-
-
-        row_ind, col_ind = linear_sum_assignment(cost_matrix)
-        best_index = col_ind[0]
-
-        best_restaurant = remaining[best_index]
-        ranked.append(best_restaurant)
-        remaining.pop(best_index)
-
-    return ranked
-
+    # k סבבים של argmin על אותן עלויות = k הזולים ביותר בסדר עולה
+    if not restaurants:
+        return []
+    engine = RankingEngine.from_restaurants(restaurants)
+    idx, _ = engine.top_k(client_lat, client_lon, k, distance_weight, wait_weight)
+    return [restaurants[i] for i in idx]
+
+
+
+# ======================= שיבוץ קבוצתי (Hungarian) =======================
+DISPATCH_BASE_CAPACITY = 8           # סועדים למסעדה כשאין בה המתנה
+DISPATCH_MIN_PER_DINER = 2.0         # דקות המתנה שכל סועד נוסף מוסיף
+DISPATCH_DENSE_MAX_CELLS = 4_000_000 # מעבר לזה – מצב sparse
+DISPATCH_CANDIDATES = 20             # מסעדות מועמדות לכל סועד במצב sparse
+DISPATCH_CHUNK = 512                 # סועדים לכל בלוק בבניית המועמדים
+DISPATCH_UNASSIGNED_COST = 1000.0
+DISPATCH_MAX_CLIENTS = 5_000         # סועדים לבקשה אחת
+
+def dispatch_capacity(waits):
+    """קיבולת לכל מסעדה לפי ההמתנה החזויה – מטבח עמוס מקבל פחות סועדים."""
+    free = 1.0 - np.minimum(waits, MAX_WAIT) / MAX_WAIT
+    return np.maximum(1, np.rint(DISPATCH_BASE_CAPACITY * free)).astype(np.intp)
+
+def dispatch_costs(engine, idx, waits, client_xyz, distance_weight=DISTANCE_WEIGHT, wait_weight=WAIT_WEIGHT):
+    """מטריצת עלויות (סועדים x מסעדות) – אותה עלות כמו ב-/find, במכפלת מטריצות אחת."""
+    cost = dot_to_chord_km(client_xyz @ engine.xyz[idx].T)
+    cost *= distance_weight / MAX_DISTANCE
+    cost += (waits * (wait_weight / MAX_WAIT))[None, :]
+    return cost
+
+def dispatch_clients(engine, idx, waits, client_lats, client_lons, mode="auto",
+                     distance_weight=DISTANCE_WEIGHT, wait_weight=WAIT_WEIGHT):
+    """שיבוץ גלובלי של סועדים למסעדות (idx) עם קיבולת.
+
+    כל מסעדה מתפרקת ל-capacity "כיסאות"; הכיסא ה-j מוסיף j*DISPATCH_MIN_PER_DINER
+    דקות להמתנה, כך שהעומס מתפזר. מחזיר (מיקום מסעדה לכל סועד או -1, mode).
+    """
+    n_clients, n_rest = len(client_lats), len(idx)
+    if n_clients == 0 or n_rest == 0:
+        return np.full(n_clients, -1, dtype=np.intp), mode
+
+    cap = dispatch_capacity(waits)
+    starts = np.cumsum(cap) - cap
+    slot_rest = np.repeat(np.arange(n_rest), cap)
+    slot_rank = np.arange(len(slot_rest)) - np.repeat(starts, cap)
+    slot_penalty = slot_rank * (wait_weight * DISPATCH_MIN_PER_DINER / MAX_WAIT)
+    client_xyz = unit_vectors(client_lats, client_lons)
+
+    if mode != "sparse":
+        # גם dense מפורש יורד ל-sparse מעל התקרה – המטריצה המלאה היא סועדים × כיסאות
+        mode = "dense" if n_clients * len(slot_rest) <= DISPATCH_DENSE_MAX_CELLS else "sparse"
+
+    assign = np.full(n_clients, -1, dtype=np.intp)
+    if mode == "dense":
+        from scipy.optimize import linear_sum_assignment
+
+        cost = dispatch_costs(engine, idx, waits, client_xyz, distance_weight, wait_weight)
+        full = cost[:, slot_rest]
+        full += slot_penalty[None, :]
+        rows, cols = linear_sum_assignment(full)
+        assign[rows] = idx[slot_rest[cols]]
+        return assign, mode
+
+    # sparse: לכל סועד רק DISPATCH_CANDIDATES המסעדות הזולות, בבלוקים כדי לחסום זיכרון
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+    m = min(DISPATCH_CANDIDATES, n_rest)
+    cand = np.empty((n_clients, m), dtype=np.intp)
+    cand_cost = np.empty((n_clients, m))
+    for lo in range(0, n_clients, DISPATCH_CHUNK):
+        block = dispatch_costs(engine, idx, waits, client_xyz[lo:lo + DISPATCH_CHUNK], distance_weight, wait_weight)
+        part = np.argpartition(block, m - 1, axis=1)[:, :m] if m < n_rest else np.broadcast_to(np.arange(n_rest), block.shape)
+        cand[lo:lo + len(block)] = part
+        cand_cost[lo:lo + len(block)] = np.take_along_axis(block, part, axis=1)
+
+    flat_rest = cand.ravel()
+    reps = cap[flat_rest]
+    rows = np.repeat(np.repeat(np.arange(n_clients), m), reps)
+    rank = np.arange(reps.sum()) - np.repeat(np.cumsum(reps) - reps, reps)
+    cols = np.repeat(starts[flat_rest], reps) + rank
+    # +1: csgraph מתייחס לאפס כאל "אין קשת"; קבוע לכל סועד לא משנה את האופטימום
+    data = np.repeat(cand_cost.ravel(), reps) + slot_penalty[cols] + 1.0
+
+    # כיסא "לא משובץ" פרטי לכל סועד – תמיד קיים שיבוץ מלא גם אחרי הגיזום
+    n_slots = len(slot_rest)
+    rows = np.concatenate([rows, np.arange(n_clients)])
+    cols = np.concatenate([cols, n_slots + np.arange(n_clients)])
+    data = np.concatenate([data, np.full(n_clients, DISPATCH_UNASSIGNED_COST + 1.0)])
+    graph = csr_matrix((data, (rows, cols)), shape=(n_clients, n_slots + n_clients))
+
+    row_ind, col_ind = min_weight_full_bipartite_matching(graph)
+    real = col_ind < n_slots
+    assign[row_ind[real]] = idx[slot_rest[col_ind[real]]]
+    return assign, mode
 
 # ======================= Predictor =======================
 DEFAULT_WAIT = 25
@@ -302,40 +1125,721 @@ LAMBDA = math.log(2.0) / HALF_LIFE_MIN
 RECENT_WINDOW_MIN = 120
 
 def reports_for_restaurant(rid, within_min=RECENT_WINDOW_MIN):
-    reports = load_reports()
-    cutoff = now_utc() - timedelta(minutes=within_min)
-    return [
-        r for r in reports
-        if r["restaurant_id"] == rid and datetime.fromisoformat(r["created_at"]) >= cutoff
-    ]
+    return reports_since(rid, now_utc() - timedelta(minutes=within_min))
+
+EPOCH = datetime(1970, 1, 1)
+PREDICTOR_SYNC_SEC = 1.0   # כל כמה זמן לקלוט דיווחים שנכתבו ע"י workers אחרים
+MAX_CLOCK_SKEW_SEC = 300   # דיווח "מהעתיד" מעבר לזה נדחה (שעון של קיוסק, טעות הקלדה)
+MAX_REPORTED_WAIT = 24 * 60   # דקות – מעבר לזה זו טעות קלט (וגם חוסם גלישה ב-SQLite / int32)
+
+# סקיצת אחוזונים: היסטוגרמה דועכת בתאים קבועים – זיכרון חסום לכל מסעדה.
+# דקה לתא עד 20 דק', אח"כ תאים רחבים; ערכים מעל 180 נופלים לתא האחרון.
+WAIT_BIN_EDGES = np.concatenate([np.arange(0, 20, 1.0), np.arange(20, 60, 2.5), np.arange(60, 181, 10.0)])
+WAIT_BINS = len(WAIT_BIN_EDGES) - 1
+WAIT_QUANTILES = (0.5, 0.9)
+# סטטיסטיקת ההמתנה שנכנסת לדירוג (/find?wait=...) -> שדה ב-bundle
+WAIT_STAT_FIELDS = {"mean": "predicted_wait", "p50": "wait_p50", "p90": "wait_p90"}
+
+def _wait_bin(wait):
+    return min(max(bisect_right(WAIT_BIN_EDGES, wait) - 1, 0), WAIT_BINS - 1)
+
+def sketch_quantiles(hist, qs):
+    """אחוזונים מהיסטוגרמה [משקלים; משקל*המתנה] – O(תאים), בלי מיון.
+
+    לכל אחוזון מחזירים את ממוצע הדיווחים (המשוקלל) בתא שבו עובר המשקל
+    המצטבר – מדויק לדקה בטווח הנפוץ, וערך קיצוני בודד לא מזיז את החציון.
+    """
+    w = np.maximum(hist[0], 0.0)
+    cum = np.cumsum(w)
+    b = np.minimum(np.searchsorted(cum, np.asarray(qs) * cum[-1]), WAIT_BINS - 1)
+    return hist[1][b] / np.maximum(w[b], 1e-300)
+
+def _minutes(dt):
+    return (dt - EPOCH).total_seconds() / 60
+
+class DecayPredictor:
+    """סכומים דועכים לכל מסעדה – עדכון ושאילתה ב-O(1) (אמורטייזד).
+
+    משקל דיווח הוא exp(LAMBDA * (t - anchor)), כך שמעבר הזמן לא משנה את
+    הסכומים השמורים (היחס sum_wm / sum_w זהה ל-exp(-LAMBDA * minutes_ago)).
+    דיווחים שיצאו מחלון RECENT_WINDOW_MIN מופחתים מהסכומים בזמן השאילתה.
+    אותם משקלים נצברים גם בהיסטוגרמה בגודל קבוע לכל מסעדה (סקיצת אחוזונים).
+    """
+
+    REANCHOR_EXP = 50.0   # לפני ש-exp גולש – מזיזים את העוגן
+
+    def __init__(self, half_life_min=HALF_LIFE_MIN, window_min=RECENT_WINDOW_MIN):
+        self.lam = math.log(2.0) / half_life_min
+        self.window_min = window_min
+        self.anchor = None
+        self.states = {}        # rid -> [deque[(t_min, wait)], sum_w, sum_wm, hist(2, WAIT_BINS)]
+        self.last_id = 0        # הדיווח האחרון שנקלט מה-DB
+        self.seen = set()       # דיווחים מקומיים עם id > last_id
+        self.loaded = False
+        self.synced_at = 0.0
+        self.lock = threading.Lock()
+
+    # ---------- עדכונים ----------
+    def _weight(self, t):
+        return math.exp(self.lam * (t - self.anchor))
+
+    def _reanchor(self, t):
+        if self.anchor is None:
+            self.anchor = t
+            return
+        shift = t - self.anchor
+        scale = math.exp(-self.lam * shift)
+        for st in self.states.values():
+            st[1] *= scale
+            st[2] *= scale
+            st[3] *= scale
+        self.anchor = t
+
+    def _add(self, rid, t, wait):
+        # דיווח מהעתיד היה מזיז את העוגן קדימה ומאפס את הסכומים של כל השאר
+        if t > _minutes(now_utc()) + MAX_CLOCK_SKEW_SEC / 60:
+            return False
+        if self.anchor is None or self.lam * (t - self.anchor) > self.REANCHOR_EXP:
+            self._reanchor(t)
+        st = self.states.get(rid)
+        if st is None:
+            st = self.states[rid] = [deque(), 0.0, 0.0, np.zeros((2, WAIT_BINS))]
+        dq = st[0]
+        if dq and t < dq[-1][0]:
+            # דיווח שהגיע באיחור (worker אחר) – הכנסה במקום, שומרים על סדר זמנים
+            insort(dq, (t, wait))
+        else:
+            dq.append((t, wait))
+        w = self._weight(t)
+        st[1] += w
+        st[2] += w * wait
+        b = _wait_bin(wait)
+        st[3][0, b] += w
+        st[3][1, b] += w * wait
+        return True
+
+    def _expire(self, st, now_min):
+        dq = st[0]
+        cutoff = now_min - self.window_min
+        while dq and dq[0][0] < cutoff:
+            t, wait = dq.popleft()
+            w = self._weight(t)
+            st[1] -= w
+            st[2] -= w * wait
+            b = _wait_bin(wait)
+            st[3][0, b] -= w
+            st[3][1, b] -= w * wait
+        if not dq:
+            st[1] = st[2] = 0.0
+            st[3][:] = 0.0
+
+    def observe(self, rep):
+        """מקפל דיווח חדש (מ-/report) למצב – O(1)."""
+        with self.lock:
+            if not self.loaded or rep.id <= self.last_id or rep.id in self.seen:
+                return
+            self.seen.add(rep.id)
+            self._add(rep.restaurant_id, _minutes(rep.created_at), rep.wait_minutes)
+
+    # ---------- סנכרון מול מאגר הדיווחים ----------
+    def _load_window(self):
+        init_report_store()
+        count("report_reads")
+        cutoff = now_utc() - timedelta(minutes=self.window_min)
+        # קודם ה-id המקסימלי ורק אז החלון עד אליו: pysqlite קורא בלי טרנזקציה,
+        # ודיווח שנכתב בין שתי השאילתות ייקלט ב-_pull_new ולא ילך לאיבוד
+        max_id = db.session.query(db.func.max(Report.id)).scalar() or 0
+        rows = (
+            db.session.query(Report.id, Report.restaurant_id, Report.wait_minutes, Report.created_at)
+            .filter(Report.created_at >= cutoff, Report.id <= max_id)
+            .order_by(Report.created_at)
+            .all()
+        )
+        for _id, rid, wait, created in rows:
+            self._add(rid, _minutes(created), wait)
+        self.last_id = max_id
+        self.loaded = True
+
+    def _pull_new(self):
+        """קולט דיווחים חדשים מה-DB; מחזיר את המסעדות שהשתנו."""
+        count("report_reads")
+        rows = (
+            db.session.query(Report.id, Report.restaurant_id, Report.wait_minutes, Report.created_at)
+            .filter(Report.id > self.last_id)
+            .order_by(Report.id)
+            .all()
+        )
+        changed = set()
+        # בסדר זמנים ולא בסדר id – קבוצה מכמה קיוסקים לא תיכנס כולה במסלול האיחור
+        for rep_id, rid, wait, created in sorted(rows, key=lambda r: r[3]):
+            if rep_id in self.seen:
+                continue
+            if self._add(rid, _minutes(created), wait):
+                changed.add(rid)
+        if rows:
+            self.last_id = rows[-1][0]
+            self.seen = {i for i in self.seen if i > self.last_id}
+        return changed
+
+    def sync(self, force=False):
+        """מסנכרן מול ה-DB (לכל היותר פעם ב-PREDICTOR_SYNC_SEC); מחזיר מסעדות שהשתנו."""
+        with self.lock:
+            if not self.loaded:
+                self._load_window()
+                self.synced_at = time.monotonic()
+            elif force or time.monotonic() - self.synced_at >= PREDICTOR_SYNC_SEC:
+                self.synced_at = time.monotonic()
+                return self._pull_new()
+        return set()
+
+    @property
+    def version(self):
+        """מזהה הדיווח האחרון שנקלט – משתנה בכל דיווח חדש."""
+        return max(self.last_id, max(self.seen, default=0))
+
+    # ---------- שאילתה ----------
+    def predict(self, rid, now=None):
+        mean, n, _q = self.predict_quantiles(rid, now, ())
+        return mean, n
+
+    def predict_quantiles(self, rid, now=None, qs=WAIT_QUANTILES):
+        """(ממוצע דועך, מספר דיווחים, [אחוזונים דועכים]).
+
+        בלי דיווחים אחרונים – הבסיס ההיסטורי לכל הערכים.
+        """
+        self.sync()
+        now_min = _minutes(now or now_utc())
+        with self.lock:
+            st = self.states.get(rid)
+            if st is not None:
+                self._expire(st, now_min)
+                if st[0] and st[1] > 0:
+                    q = sketch_quantiles(st[3], qs) if qs else ()
+                    return round(st[2] / st[1], 1), len(st[0]), [round(float(v), 1) for v in q]
+        base = historical_baseline(rid, now)
+        return base, 0, [base] * len(qs)
+
+predictor = DecayPredictor()
 
 def weighted_prediction_for_restaurant(rest):
-    recents = reports_for_restaurant(rest["id"])
-    if not recents:
-        return DEFAULT_WAIT, 0
-
-    weights = []
-    waits = []
-    now = now_utc()
-
-    for rep in recents:
-        minutes_ago = (now - datetime.fromisoformat(rep["created_at"])).total_seconds() / 60
-        w = math.exp(-LAMBDA * minutes_ago)
-        weights.append(w)
-        waits.append(rep["wait_minutes"])
-
-    pred = sum(w*m for w, m in zip(weights, waits)) / sum(weights)
-    return round(pred, 1), len(recents)
+    return predictor.predict(rest["id"])
 
 def predicted_wait_bundle(rest):
-    pred, n = weighted_prediction_for_restaurant(rest)
+    pred, n, (p50, p90) = predictor.predict_quantiles(rest["id"])
     return {
         "restaurant_id": rest["id"],
         "name": rest["name"],
         "predicted_wait": pred,
+        "wait_p50": p50,
+        "wait_p90": p90,
         "n_reports_used": n
     }
 
+# ======================= דחיסת דיווחים ובסיס היסטורי =======================
+REPORT_RETENTION_MIN = RECENT_WINDOW_MIN   # דיווחים גולמיים נשמרים רק בחלון התחזית
+REPORT_COMPACT_SEC = 600                   # כל כמה זמן ה-thread ברקע דוחס
+REPORT_ARCHIVE = os.environ.get("FOODI_REPORT_ARCHIVE")   # CSV אופציונלי לניתוח offline
+BASELINE_MIN_REPORTS = 3
+BASELINE_REFRESH_SEC = 300
+
+def hour_of_week(dt):
+    return dt.weekday() * 24 + dt.hour
+
+def _sql_hour_of_week(col):
+    # strftime('%w'): ראשון = 0 -> מזיזים כך ששני = 0, כמו datetime.weekday()
+    dow = db.cast(db.func.strftime('%w', col), db.Integer)
+    hour = db.cast(db.func.strftime('%H', col), db.Integer)
+    return ((dow + 6) % 7) * 24 + hour
+
+class HistoricalBaseline:
+    """ממוצע היסטורי לכל (מסעדה, שעה-בשבוע) מטבלת האגרגטים – שאילתה ב-O(1)."""
+
+    def __init__(self):
+        self.by_hour = {}       # (rid, how) -> ממוצע
+        self.by_restaurant = {} # rid -> ממוצע על כל השעות
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        init_report_store()
+        by_hour, totals = {}, {}
+        rows = db.session.query(
+            ReportAggregate.restaurant_id, ReportAggregate.hour_of_week,
+            ReportAggregate.n_reports, ReportAggregate.wait_sum
+        ).all()
+        for rid, how, n, total in rows:
+            if n >= BASELINE_MIN_REPORTS:
+                by_hour[(rid, how)] = total / n
+            t = totals.setdefault(rid, [0, 0.0])
+            t[0] += n
+            t[1] += total
+        with self.lock:
+            self.by_hour = by_hour
+            self.by_restaurant = {rid: s / n for rid, (n, s) in totals.items() if n >= BASELINE_MIN_REPORTS}
+            self.loaded_at = time.monotonic()
+
+    def get(self, rid, when):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at >= BASELINE_REFRESH_SEC:
+            self.load()
+        mean = self.by_hour.get((rid, hour_of_week(when)))
+        if mean is None:
+            mean = self.by_restaurant.get(rid, DEFAULT_WAIT)
+        return mean
+
+baseline = HistoricalBaseline()
+
+def historical_baseline(rid, when=None):
+    """תחזית למסעדה בלי דיווחים אחרונים: ממוצע השעה-בשבוע, אחרת ממוצע כללי, אחרת DEFAULT_WAIT."""
+    return round(baseline.get(rid, when or now_utc()), 1)
+
+def compact_reports(older_than_min=REPORT_RETENTION_MIN):
+    """מגלגל דיווחים שמחוץ לחלון לאגרגטים לפי שעה-בשבוע ומוחק את השורות הגולמיות.
+
+    הכל בטרנזקציה אחת; הגבול על id מבטיח שדיווח שנכנס בזמן הדחיסה לא
+    יימחק בלי להיספר.
+    """
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+    init_report_store()
+    cutoff = now_utc() - timedelta(minutes=older_than_min)
+    max_id = db.session.query(db.func.max(Report.id)).scalar() or 0
+    old = db.and_(Report.id <= max_id, Report.created_at < cutoff)
+
+    how = _sql_hour_of_week(Report.created_at)
+    groups = (
+        db.session.query(
+            Report.restaurant_id, how,
+            db.func.count(), db.func.sum(Report.wait_minutes),
+            db.func.sum(Report.wait_minutes * Report.wait_minutes)
+        )
+        .filter(old)
+        .group_by(Report.restaurant_id, how)
+        .all()
+    )
+    if not groups:
+        db.session.rollback()
+        return 0
+
+    if REPORT_ARCHIVE:
+        with open(REPORT_ARCHIVE, "a", encoding="utf-8") as f:
+            for rep_id, rid, wait, created in (
+                db.session.query(Report.id, Report.restaurant_id, Report.wait_minutes, Report.created_at)
+                .filter(old).order_by(Report.id).yield_per(10_000)
+            ):
+                f.write(f"{rep_id},{rid},{wait},{created.isoformat()}\n")
+
+    stmt = sqlite_insert(ReportAggregate)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ReportAggregate.restaurant_id, ReportAggregate.hour_of_week],
+        set_={
+            "n_reports": ReportAggregate.n_reports + stmt.excluded.n_reports,
+            "wait_sum": ReportAggregate.wait_sum + stmt.excluded.wait_sum,
+            "wait_sumsq": ReportAggregate.wait_sumsq + stmt.excluded.wait_sumsq,
+        }
+    )
+    db.session.execute(stmt, [
+        {"restaurant_id": rid, "hour_of_week": h, "n_reports": n, "wait_sum": float(s1), "wait_sumsq": float(s2)}
+        for rid, h, n, s1, s2 in groups
+    ])
+    removed = Report.query.filter(old).delete(synchronize_session=False)
+    db.session.commit()
+    baseline.load()
+    return removed
+
+def compact_reports_once():
+    """דחיסה ע"י worker אחד בלבד (נעילת קובץ לא חוסמת); מחזיר None אם worker אחר באמצע."""
+    os.makedirs(app.instance_path, exist_ok=True)
+    with open(os.path.join(app.instance_path, ".compact.lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        return compact_reports()
+
+@app.cli.command("compact-reports")
+def compact_reports_command():
+    """דחיסת דיווחים ישנים לאגרגטים שעתיים."""
+    removed = compact_reports_once()
+    print(f"[compact_reports] compacted {removed or 0} reports")
+
+# ======================= אירועי שינוי המתנה (SSE) =======================
+WAIT_EVENT_THRESHOLD = 2.0   # דקות – שינוי קטן מזה לא נשלח
+WAIT_EVENT_BUFFER = 4096     # אירועים אחרונים שנשמרים (גם ל-Last-Event-ID)
+SSE_HEARTBEAT_SEC = 15.0
+
+class WaitEventHub:
+    """Fan-out של אירועים: טבעת אחת משותפת וסמן (seq) לכל מנוי – בלי תור לכל לקוח.
+
+    חיבור פתוח ממתין על Condition אחד; תחת worker של gevent זה greenlet ולא thread.
+    כל worker מזין את ה-hub שלו מה-PredictionRefresher, שקולט גם דיווחים
+    של workers אחרים דרך טבלת הדיווחים המשותפת.
+    """
+
+    def __init__(self, size=WAIT_EVENT_BUFFER):
+        self.events = deque(maxlen=size)   # (seq, event)
+        self.seq = 0
+        self.cond = threading.Condition()
+        self._boot = None       # (pid, מזהה) – seq מקומי לתהליך, ולכן גם ה-id של האירוע
+
+    @property
+    def boot(self):
+        """מזהה התהליך שמוצמד ל-id של כל אירוע (אחרי fork כל worker מקבל חדש)."""
+        if self._boot is None or self._boot[0] != os.getpid():
+            self._boot = (os.getpid(), f"{os.getpid():x}{time.time_ns():x}")
+        return self._boot[1]
+
+    def event_id(self, seq):
+        return f"{self.boot}-{seq}"
+
+    def cursor_from(self, last_event_id):
+        """Last-Event-ID -> סמן; id של תהליך אחר (worker אחר / אתחול) = מעכשיו."""
+        boot, _, seq = (last_event_id or "").rpartition("-")
+        if boot != self.boot or not seq.isdigit():
+            return self.seq
+        return min(int(seq), self.seq)
+
+    def publish(self, events):
+        if not events:
+            return
+        with self.cond:
+            for ev in events:
+                self.seq += 1
+                self.events.append((self.seq, ev))
+            self.cond.notify_all()
+
+    def wait(self, cursor, timeout=SSE_HEARTBEAT_SEC):
+        """אירועים עם seq > cursor (ממתין עד timeout); מחזיר (אירועים, סמן חדש)."""
+        with self.cond:
+            cursor = min(cursor, self.seq)   # סמן "מהעתיד" היה ממתין לנצח
+            self.cond.wait_for(lambda: self.seq > cursor, timeout=timeout)
+            if self.seq <= cursor:
+                return [], cursor
+            if cursor < self.seq - len(self.events):
+                cursor = self.seq - len(self.events)   # הלקוח פספס – מתחילים מהישן ביותר
+            start = len(self.events) - (self.seq - cursor)
+            return [self.events[i] for i in range(start, len(self.events))], self.seq
+
+hub = WaitEventHub()
+
+def wait_change_events(old, new, rids=None):
+    """השוואת שתי טבלאות תחזית -> אירועים למסעדות שההמתנה שלהן זזה מעל הסף."""
+    if old is None or old.catalog_version != new.catalog_version:
+        return []
+    snap = get_catalog()
+    rows = snap.rows() if snap.version == new.catalog_version else None
+    positions = range(len(new.bundles)) if rids is None else [new.pos[r] for r in rids if r in new.pos]
+    events = []
+    for i in positions:
+        before, after = old.bundles[i], new.bundles[i]
+        if abs(after["predicted_wait"] - before["predicted_wait"]) < WAIT_EVENT_THRESHOLD:
+            continue
+        events.append({
+            "restaurant_id": after["restaurant_id"],
+            "name": after["name"],
+            "type": rows[i]["type"] if rows is not None else "",
+            "predicted_wait": after["predicted_wait"],
+            "previous_wait": before["predicted_wait"],
+            "n_reports_used": after["n_reports_used"]
+        })
+    return events
+
+# ======================= טבלת תחזיות ברקע =======================
+PREDICTION_REFRESH_SEC = float(os.environ.get("FOODI_PREDICTION_REFRESH_SEC", 30))  # 0 = כבוי
+PREDICTION_POLL_SEC = 1.0
+
+class PredictionTable:
+    """תחזיות לכל המסעדות הזמינות, לפי סדר הקטלוג. לא משתנה אחרי פרסום."""
+
+    def __init__(self, catalog_version, bundles, pos=None, ids=None, waits=None):
+        """waits – {סטטיסטיקה: מערך} לפי WAIT_STAT_FIELDS (נבנה מה-bundles אם חסר)."""
+        self.catalog_version = catalog_version
+        self.bundles = bundles
+        self.pos = pos if pos is not None else {b["restaurant_id"]: i for i, b in enumerate(bundles)}
+        # עמודות לשליפה וקטורית; הקטלוג ממוין לפי id, ולכן גם ids
+        self.ids = ids if ids is not None else np.array([b["restaurant_id"] for b in bundles], dtype=np.int64)
+        self.waits = waits if waits is not None else {
+            stat: np.array([b[field] for b in bundles], dtype=np.float64)
+            for stat, field in WAIT_STAT_FIELDS.items()
+        }
+        # טביעת תוכן – זהה בכל worker ובכל רענון שלא שינה דבר (ל-ETag)
+        h = hashlib.sha1(self.ids.tobytes())
+        for stat in WAIT_STAT_FIELDS:
+            h.update(self.waits[stat].tobytes())
+        h.update(np.array([b["n_reports_used"] for b in bundles], dtype=np.int64).tobytes())
+        self.digest = h.hexdigest()
+        self.computed_at = time.time()
+
+class PredictionRefresher:
+    """מחשב את טבלת התחזיות ב-thread רקע ומפרסם אותה בהחלפת הפניה אחת.
+
+    בקשות קוראות תמיד את הטבלה האחרונה שפורסמה (stale-while-revalidate);
+    דיווח חדש מקדים רענון ממוקד של המסעדה שלו. ה-thread עולה בנפרד בכל
+    worker (בדיקת pid), כך שזה בטוח גם עם preload/fork של gunicorn.
+    """
+
+    def __init__(self, refresh_sec=PREDICTION_REFRESH_SEC):
+        self.refresh_sec = refresh_sec
+        self.table = None
+        self.pending = set()
+        self.cond = threading.Condition()
+        self.pid = None
+
+    @property
+    def enabled(self):
+        return self.refresh_sec > 0
+
+    def ensure_started(self):
+        if not self.enabled or self.pid == os.getpid():
+            return
+        with self.cond:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.pending = set()
+            threading.Thread(target=self._run, name="prediction-refresher", daemon=True).start()
+
+    def compute_full(self):
+        snap = get_catalog()
+        return PredictionTable(snap.version, [predicted_wait_bundle(r) for r in snap.rows()])
+
+    def compute_targeted(self, table, rids):
+        bundles = list(table.bundles)
+        waits = {stat: col.copy() for stat, col in table.waits.items()}
+        for rid in rids:
+            i = table.pos.get(rid)
+            if i is not None:
+                bundles[i] = predicted_wait_bundle({"id": rid, "name": bundles[i]["name"]})
+                for stat, field in WAIT_STAT_FIELDS.items():
+                    waits[stat][i] = bundles[i][field]
+        return PredictionTable(table.catalog_version, bundles, table.pos, table.ids, waits)
+
+    def _run(self):
+        last_full = last_compact = time.monotonic()
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending, timeout=PREDICTION_POLL_SEC)
+                rids, self.pending = self.pending, set()
+            with app.app_context():
+                try:
+                    rids |= predictor.sync(force=True)   # דיווחים מ-workers אחרים
+                    table = self.table
+                    if (
+                        table is None
+                        or table.catalog_version != get_catalog().version
+                        or time.monotonic() - last_full >= self.refresh_sec
+                    ):
+                        self.table = self.compute_full()
+                        last_full = time.monotonic()
+                        hub.publish(wait_change_events(table, self.table))
+                    elif rids:
+                        self.table = self.compute_targeted(table, rids)
+                        hub.publish(wait_change_events(table, self.table, rids))
+                    if rids:
+                        # גם כשהמשיכה נפלה על רענון מלא – אחרת מועמדים ישנים עד ה-TTL
+                        find_cache.invalidate_restaurants(rids)
+                    if time.monotonic() - last_compact >= REPORT_COMPACT_SEC:
+                        last_compact = time.monotonic()
+                        compact_reports_once()
+                except Exception:
+                    app.logger.exception("prediction refresh failed")
+                finally:
+                    db.session.remove()
+
+    def warm(self):
+        """חישוב הטבלה מראש (ב-bootstrap, לפני fork) – הבקשה הראשונה לא מחשבת."""
+        if self.enabled:
+            self.table = self.compute_full()
+
+    def _request_table(self):
+        """כשכבוי: הטבלה שכבר נבנתה בבקשה הנוכחית (או None)."""
+        if has_request_context():
+            return g.get("foodi_prediction_table")
+        return None
+
+    def current(self):
+        """הטבלה האחרונה שפורסמה; רק בבקשה הראשונה (או כשכבוי) מחשבים בתוך הבקשה.
+
+        כשכבוי הטבלה נבנית לכל היותר פעם אחת בבקשה.
+        """
+        if not self.enabled:
+            table = self._request_table()
+            if table is None:
+                table = self.compute_full()
+                if has_request_context():
+                    g.foodi_prediction_table = table
+            return table
+        self.ensure_started()
+        table = self.table
+        if table is None:
+            table = self.table = self.compute_full()
+        return table
+
+    def waits(self, rids, stat="mean"):
+        """זמני המתנה חזויים (mean / p50 / p90) למערך מזהים – שליפה וקטורית מהטבלה.
+
+        כשכבוי ואין עדיין טבלה בבקשה – חוזים רק את המזהים המבוקשים.
+        """
+        field = WAIT_STAT_FIELDS[stat]
+        rids = np.asarray(rids, dtype=np.int64)
+        table = self.current() if self.enabled else self._request_table()
+        if table is None or not len(table.ids):
+            return np.array([predicted_wait_bundle({"id": r, "name": ""})[field] for r in rids.tolist()], dtype=np.float64)
+        pos = np.minimum(np.searchsorted(table.ids, rids), len(table.ids) - 1)
+        out = table.waits[stat][pos]
+        missing = np.flatnonzero(table.ids[pos] != rids)
+        for i in missing.tolist():
+            out[i] = predicted_wait_bundle({"id": int(rids[i]), "name": ""})[field]
+        return out
+
+    def bundle(self, rest):
+        table = self.current() if self.enabled else self._request_table()
+        if table is None:
+            return predicted_wait_bundle(rest)
+        i = table.pos.get(rest["id"])
+        if i is None:
+            return predicted_wait_bundle(rest)
+        return dict(table.bundles[i])
+
+    def touch(self, rid):
+        """דיווח חדש – רענון ממוקד מוקדם למסעדה אחת."""
+        if not self.enabled or self.pid != os.getpid():
+            return
+        with self.cond:
+            self.pending.add(rid)
+            self.cond.notify()
+
+refresher = PredictionRefresher()
+
+# ======================= מטמון תוצאות /find לפי תא רשת =======================
+FIND_CACHE_CELL_M = 100       # גודל תא הכימות (מטרים)
+FIND_CACHE_SIZE = int(os.environ.get("FOODI_FIND_CACHE_SIZE", 10000))   # 0 = כבוי
+FIND_CACHE_TTL_SEC = 60
+FIND_CACHE_EXTRA = 10         # מועמדים נוספים מעבר ל-k, לדירוג מחדש מהמיקום המדויק
+FIND_CACHE_INVALIDATE_CHUNK = 256     # נקודות לכל מכפלת מטריצות בפסילה (זיכרון חסום)
+FIND_CACHE_CLEAR_CELLS = 2_000_000    # רשומות × נקודות שמעליהן פשוט מרוקנים את המטמון
+
+class FindCache:
+    """LRU + TTL של מועמדי /find לכל (תא ~100 מ', סוג מטבח, k, רדיוס).
+
+    המטמון שומר רק את k + FIND_CACHE_EXTRA המועמדים שנבחרו ממרכז התא, ברדיוס
+    מורחב באלכסון התא; כל בקשה מדרגת אותם מחדש מהמיקום המדויק שלה עם זמני
+    ההמתנה העדכניים. מרכזי הרשומות נשמרים כמערך, כך שפסילה ממוקדת סביב מסעדה
+    (דיווח / עריכה) היא פעולה וקטורית על הרשומות התפוסות בלבד, בחלקים חסומים.
+    """
+
+    def __init__(self, size=FIND_CACHE_SIZE, ttl=FIND_CACHE_TTL_SEC, cell_m=FIND_CACHE_CELL_M):
+        self.size = size
+        self.ttl = ttl
+        self.dlat = cell_m / 111320.0
+        self.diag_km = cell_m * math.sqrt(2) / 1000.0
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()     # key -> (slot, expires, version, positions)
+        self.slot_keys = [None] * size
+        self.free = list(range(size - 1, -1, -1))
+        self.centers = np.zeros((size, 3))
+        self.reach = np.full(size, -1.0) # רדיוס החיפוש + אלכסון; -1 = תא ריק
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def _cell(self, lat, lon):
+        ci = math.floor(lat / self.dlat)
+        dlon = self.dlat / max(math.cos(math.radians((ci + 0.5) * self.dlat)), 0.01)
+        cj = math.floor(lon / dlon)
+        return ci, cj, (ci + 0.5) * self.dlat, (cj + 0.5) * dlon
+
+    def _drop(self, key):
+        slot = self.entries.pop(key)[0]
+        self.slot_keys[slot] = None
+        self.reach[slot] = -1.0
+        self.free.append(slot)
+
+    def candidates(self, index, lat, lon, cuisine, radius, k, wait_stat="mean"):
+        """מיקומי מועמדים באינדקס המרחבי (מהמטמון או מחישוב ממרכז התא)."""
+        if self.size <= 0:
+            return index.query(lat, lon, radius, cuisine)
+
+        ci, cj, clat, clon = self._cell(lat, lon)
+        key = (ci, cj, cuisine or "", k, radius, wait_stat)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > now and entry[2] == index.version:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[3]
+            self.stats["misses"] += 1
+
+        cand = index.query(clat, clon, radius + self.diag_km, cuisine)
+        if len(cand):
+            waits = refresher.waits(index.ids[cand], wait_stat)
+            order, _ = index.engine.top_k(clat, clon, k + FIND_CACHE_EXTRA, idx=cand, wait=waits)
+            cand = np.sort(order)
+
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            while not self.free:
+                self._drop(next(iter(self.entries)))
+                self.stats["evictions"] += 1
+            slot = self.free.pop()
+            self.entries[key] = (slot, now + self.ttl, index.version, cand)
+            self.slot_keys[slot] = key
+            self.centers[slot] = unit_vectors([clat], [clon])[0]
+            self.reach[slot] = radius + self.diag_km
+        return cand
+
+    def invalidate_near(self, lats, lons):
+        """פוסל כל רשומה שהמסעדות (lat, lon) נמצאות בתוך רדיוס החיפוש שלה."""
+        if self.size <= 0 or not len(lats):
+            return 0
+        pts = unit_vectors(lats, lons)
+        with self.lock:
+            slots = np.flatnonzero(self.reach >= 0)
+            if not len(slots):
+                return 0
+            if len(slots) * len(pts) > FIND_CACHE_CLEAR_CELLS:
+                # פסילה גורפת (למשל בקליטת bulk) – זול יותר לרוקן הכול
+                hit = slots
+            else:
+                centers, reach = self.centers[slots], self.reach[slots]
+                mask = np.zeros(len(slots), dtype=bool)
+                for i in range(0, len(pts), FIND_CACHE_INVALIDATE_CHUNK):
+                    dist = dot_to_chord_km(centers @ pts[i:i + FIND_CACHE_INVALIDATE_CHUNK].T)
+                    mask |= (dist <= reach[:, None]).any(axis=1)
+                hit = slots[mask]
+            for slot in hit.tolist():
+                self._drop(self.slot_keys[slot])
+            self.stats["invalidations"] += len(hit)
+            return len(hit)
+
+    def invalidate_restaurants(self, rids):
+        if self.size <= 0 or not rids:
+            return 0
+        snap = get_catalog()
+        pos = snap.positions(list(rids))
+        pos = pos[pos >= 0]
+        lats, lons = snap.lat[pos], snap.lon[pos]
+        ok = ~(np.isnan(lats) | np.isnan(lons))
+        return self.invalidate_near(lats[ok], lons[ok])
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries):
+                self._drop(key)
+
+    def metric_lines(self):
+        pid = os.getpid()
+        lines = ["# TYPE foodi_find_cache_events_total counter"]
+        lines += [f'foodi_find_cache_events_total{{event="{k}",pid="{pid}"}} {v}' for k, v in self.stats.items()]
+        lines.append("# TYPE foodi_find_cache_entries gauge")
+        lines.append(f'foodi_find_cache_entries{{pid="{pid}"}} {len(self.entries)}')
+        total = self.stats["hits"] + self.stats["misses"]
+        lines.append("# TYPE foodi_find_cache_hit_ratio gauge")
+        lines.append(f'foodi_find_cache_hit_ratio{{pid="{pid}"}} {self.stats["hits"] / total if total else 0:.4f}')
+        return lines
+
+find_cache = FindCache()
+metrics.collectors.append(find_cache.metric_lines)
+
 # ======================= עמוד הבית =======================
 @app.route("/")
 def home():
@@ -344,74 +1848,256 @@ def home():
 # ======================= תוצאות כלליות =======================
 @app.route("/results")
 def results_page():
-    restaurants = load_restaurants()
-    enriched = [predicted_wait_bundle(r) for r in restaurants]
-    return render_template("results.html", predictions=enriched)
+    with stage("predict"):
+        predictions = refresher.current().bundles
+    with stage("render"):
+        return render_template("results.html", predictions=predictions)
 
 # ======================= חיפוש מסעדה לפי מיקום =======================
-@app.route("/find")
-def find_restaurant():
+def parse_search_location():
+    """(lat, lon, radius) מה-query string; ValueError על ערך חסר / לא סופי / מחוץ לטווח.
+
+    הרדיוס נחתך ל-MAX_SEARCH_RADIUS – עלות השאילתה גדלה עם שטח הריבוע החוסם.
+    """
     lat = request.args.get("lat", type=float)
     lon = request.args.get("lon", type=float)
+    radius = request.args.get("radius", default=MAX_DISTANCE, type=float)
+    if lat is None or lon is None:
+        raise ValueError("חסרים lat / lon")
+    if not (math.isfinite(lat) and math.isfinite(lon) and math.isfinite(radius)):
+        raise ValueError("lat / lon / radius חייבים להיות מספרים סופיים")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat / lon מחוץ לטווח")
+    return lat, lon, min(max(radius, 0.0), MAX_SEARCH_RADIUS)
+
+@app.route("/find")
+def find_restaurant():
     cuisine = request.args.get("type", type=str)
+    wait_stat = request.args.get("wait", default="mean", type=str)
 
     # ✅ מנרמלים את מה שהמשתמש הזין
     cuisine = normalize_type(cuisine)
+    if wait_stat not in WAIT_STAT_FIELDS:
+        wait_stat = "mean"
 
-    if lat is None or lon is None:
+    try:
+        lat, lon, radius = parse_search_location()
+    except ValueError:
         return render_template(
             "results_search.html",
             results=[],
             error="לא התקבל מיקום. יש ללחוץ על 'אתר אותי'."
         )
 
-    restaurants = load_restaurants()
-    results = []
-
-    for r in restaurants:
-        if r["lat"] is None or r["lon"] is None:
-            continue
+    results = search_restaurants(lat, lon, cuisine, radius, wait_stat=wait_stat)
+    with stage("render"):
+        return render_template(
+            "results_search.html",
+            results=results,
+            error=None
+        )
 
-        # ✅ משווים על בסיס נרמול
-        if cuisine and normalize_type(r["type"]) != cuisine:
-            continue
+def search_restaurants(lat, lon, cuisine="", radius=MAX_DISTANCE, k=5, wait_stat="mean"):
+    """k המסעדות המומלצות (bundles עם id, lat, lon, distance_km).
+
+    wait_stat – איזה זמן המתנה נכנס לעלות: mean (ממוצע דועך), p50 או p90.
+    """
+    if k < 1:
+        return []
+    with stage("catalog"):
+        index = get_spatial_index()
+    with stage("cache"):
+        candidates = find_cache.candidates(index, lat, lon, cuisine, radius, k, wait_stat)
+    if not len(candidates):
+        return []
+
+    # 🔥 דירוג וקטורי מהמיקום המדויק של הלקוח; מרחקים מדויקים ל-k הנבחרות
+    with stage("predict"):
+        waits = refresher.waits(index.ids[candidates], wait_stat)
+    with stage("rank"):
+        order, dist = index.engine.top_k(
+            lat, lon, k=min(len(candidates), k + FIND_CACHE_EXTRA), idx=candidates, wait=waits
+        )
 
-        d = haversine(lat, lon, r["lat"], r["lon"])
-        b = predicted_wait_bundle(r)
-        b["id"] = r["id"]                 # ← זו השורה החסרה
-        b["distance_km"] = round(d, 2)
+    ranked_results = []
+    for pos, d in zip(order.tolist(), dist):
+        if d > radius:
+            continue   # מועמד מהמטמון של התא שיוצא מהרדיוס של הלקוח עצמו
+        r = index.restaurants[pos]
+        b = refresher.bundle(r)
+        b["id"] = r["id"]
         b["lat"] = r["lat"]
         b["lon"] = r["lon"]
+        b["distance_km"] = round(float(d), 2)
+        ranked_results.append(b)
+        if len(ranked_results) >= k:
+            break
+
+    return ranked_results
+
+# ======================= JSON API (עם ETag) =======================
+API_BODY_CACHE_MAX = 256
+API_FIND_MAX_K = 50
+_api_body_cache = {}
+
+def api_etag(*parts):
+    """ETag חזק מגרסת הקטלוג, גרסת הדיווחים, תוכן טבלת התחזיות ופרמטרי הבקשה.
+
+    רק קלטים שתלויים בתוכן – אותו גוף מקבל אותו תג בכל worker ואחרי כל רענון
+    שלא שינה דבר; דיווחים שיוצאים מהחלון משנים את הטבלה ולכן גם את התג.
+    """
+    predictor.sync()
+    raw = "|".join(str(x) for x in (
+        get_catalog().version,
+        predictor.version,
+        refresher.current().digest,
+    ) + parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:24]
+
+def api_response(tag, build):
+    """304 אם הלקוח מחזיק את אותו ETag; אחרת גוף מהמטמון או build() חדש."""
+    if request.if_none_match.contains(tag):
+        resp = app.response_class(status=304)
+    else:
+        body = _api_body_cache.get(tag)
+        if body is None:
+            body = json.dumps(build(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            if len(_api_body_cache) >= API_BODY_CACHE_MAX:
+                _api_body_cache.clear()
+            _api_body_cache[tag] = body
+        resp = app.response_class(body, mimetype="application/json")
+    resp.set_etag(tag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@app.route("/api/predictions")
+def api_predictions():
+    tag = api_etag("predictions")
+    return api_response(tag, lambda: {
+        "predictions": refresher.current().bundles
+    })
 
-        results.append(b)
-
-        
+@app.route("/api/find")
+def api_find():
+    cuisine = normalize_type(request.args.get("type", type=str))
+    k = request.args.get("k", default=5, type=int)
+    wait_stat = request.args.get("wait", default="mean", type=str)
+
+    try:
+        lat, lon, radius = parse_search_location()
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    if wait_stat not in WAIT_STAT_FIELDS:
+        return jsonify(error="wait חייב להיות " + " / ".join(WAIT_STAT_FIELDS)), 400
+    if k is None or not 1 <= k <= API_FIND_MAX_K:
+        return jsonify(error=f"k חייב להיות בין 1 ל-{API_FIND_MAX_K}"), 400
+
+    tag = api_etag("find", lat, lon, cuisine, radius, k, wait_stat)
+    return api_response(tag, lambda: {
+        "results": search_restaurants(lat, lon, cuisine, radius, k, wait_stat)
+    })
 
-    # 🔥 האלגוריתם ההונגרי – מחוץ ללולאה
-    ranked_results = hungarian_top_k_restaurants_for_client(
-    client_lat=lat,
-    client_lon=lon,
-    restaurants=results,
-    k=5
-)
+# ======================= שיבוץ קבוצות / אירועים =======================
+@app.route("/api/dispatch", methods=["POST"])
+def dispatch_api():
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify(error="גוף הבקשה חייב להיות אובייקט JSON"), 400
+    clients = data.get("clients") or []
+    if not isinstance(clients, list):
+        return jsonify(error="clients חייב להיות רשימה"), 400
+    if len(clients) > DISPATCH_MAX_CLIENTS:
+        return jsonify(error=f"עד {DISPATCH_MAX_CLIENTS} סועדים בבקשה"), 413
+    try:
+        lats = np.array([float(c["lat"]) for c in clients], dtype=np.float64)
+        lons = np.array([float(c["lon"]) for c in clients], dtype=np.float64)
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return jsonify(error="כל סועד צריך lat ו-lon מספריים"), 400
+    if not (np.isfinite(lats).all() and np.isfinite(lons).all()
+            and (np.abs(lats) <= 90).all() and (np.abs(lons) <= 180).all()):
+        return jsonify(error="lat / lon חייבים להיות מספרים סופיים בטווח"), 400
+
+    mode = data.get("mode", "auto")
+    if mode not in ("auto", "dense", "sparse"):
+        return jsonify(error="mode חייב להיות auto / dense / sparse"), 400
+
+    cuisine = data.get("type")
+    if cuisine is not None and not isinstance(cuisine, str):
+        return jsonify(error="type חייב להיות מחרוזת"), 400
+    cuisine = normalize_type(cuisine)
+    index = get_spatial_index()
+    idx = index.positions(cuisine)
+    waits = refresher.waits(index.ids[idx])   # אותו מקור כמו /find
 
+    assign, mode = dispatch_clients(index.engine, idx, waits, lats, lons, mode=mode)
 
-    return render_template(
-        "results_search.html",
-        results=ranked_results,
-        error=None
+    wait_of = dict(zip(idx.tolist(), waits.tolist()))
+    out = []
+    for i, p in enumerate(assign.tolist()):
+        if p < 0:
+            out.append(None)
+            continue
+        r = index.restaurants[p]
+        out.append({
+            "restaurant_id": r["id"],
+            "name": r["name"],
+            "distance_km": round(haversine(lats[i], lons[i], r["lat"], r["lon"]), 2),
+            "predicted_wait": wait_of[p]
+        })
+
+    return jsonify(mode=mode, assignments=out)
+
+# ======================= זרם עדכוני המתנה =======================
+@app.route("/stream/waits")
+def stream_waits():
+    ids = set(request.args.getlist("restaurant_id", type=int))
+    for part in request.args.get("ids", "").split(","):
+        if part.strip().isdigit():
+            ids.add(int(part))
+    cuisine = normalize_type(request.args.get("type", type=str))
+    cursor = hub.cursor_from(request.headers.get("Last-Event-ID"))
+
+    refresher.ensure_started()
+
+    def events(cursor):
+        yield "retry: 3000\n\n"
+        while True:
+            batch, cursor = hub.wait(cursor)
+            if not batch:
+                yield ": ping\n\n"
+                continue
+            for seq, ev in batch:
+                if ids and ev["restaurant_id"] not in ids:
+                    continue
+                if cuisine and ev["type"] != cuisine:
+                    continue
+                data = json.dumps(ev, ensure_ascii=False, separators=(",", ":"))
+                yield f"id: {hub.event_id(seq)}\nevent: wait\ndata: {data}\n\n"
+
+    return Response(
+        events(cursor),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+# ======================= השלמה אוטומטית לשמות =======================
+@app.route("/api/restaurants/suggest")
+def suggest_restaurants():
+    q = request.args.get("q", "", type=str)
+    limit = min(request.args.get("limit", default=8, type=int), 50)
+    return jsonify(suggestions=get_name_index().suggest(q, limit))
+
 # ======================= דיווח עומס =======================
 @app.route("/report", methods=["GET", "POST"])
 def report_api():
     if request.method == "GET":
         preselected = request.args.get("restaurant_id", type=int)
-        return render_template(
-            "report_form.html",
-            restaurants=load_restaurants(),
-            preselected=preselected
-        )
+        with stage("render"):
+            # הרשימה לא נשלחת לדפדפן – השלמה אוטומטית דרך /api/restaurants/suggest
+            return render_template(
+                "report_form.html",
+                preselected=preselected
+            )
 
     data = request.form
 
@@ -421,49 +2107,377 @@ def report_api():
 
     restaurant = None
 
-    # 1️⃣ נבחרה מסעדה מהרשימה
-    if restaurant_id:
-        restaurant = Restaurant.query.get(int(restaurant_id))
-
-    # 2️⃣ לא נבחרה – הוזן שם ידני
-    elif restaurant_name:
-        restaurant = Restaurant.query.filter(
-            Restaurant.name.ilike(restaurant_name)
-        ).first()
-
-        # 3️⃣ לא קיימת – יוצרים חדשה
-        if not restaurant:
-            restaurant = Restaurant(
-                name=restaurant_name,
-                available=True,
-                wait_time=wait
-            )
-            db.session.add(restaurant)
-            db.session.commit()
+    with stage("resolve"):
+        # 1️⃣ נבחרה מסעדה מהרשימה
+        if restaurant_id:
+            restaurant = Restaurant.query.get(int(restaurant_id))
+
+        # 2️⃣ לא נבחרה – הוזן שם ידני (אינדקס שמות: ניקוד, סימנים, כינויים – התאמה מדויקת)
+        elif restaurant_name:
+            rid = get_name_index().resolve(restaurant_name)
+            if rid is not None:
+                restaurant = db.session.get(Restaurant, rid)
+
+            # 3️⃣ לא קיימת – יוצרים חדשה
+            if not restaurant:
+                restaurant = Restaurant(
+                    name=restaurant_name,
+                    available=True,
+                    wait_time=wait
+                )
+                db.session.add(restaurant)
+                try:
+                    db.session.commit()
+                    catalog_inserted(restaurant.to_dict())
+                except IntegrityError:
+                    # worker אחר יצר אותה בדיוק עכשיו
+                    db.session.rollback()
+                    restaurant = Restaurant.query.filter_by(name=restaurant_name).first()
 
     if not restaurant:
         return "שגיאה: לא נבחרה מסעדה", 400
 
-    reports = load_reports()
-    reports.append({
-        "id": len(reports) + 1,
-        "restaurant_id": restaurant.id,
-        "wait_minutes": wait,
-        "created_at": now_utc().isoformat(),
-    })
-    save_reports(reports)
+    with stage("write"):
+        rep = append_report(restaurant.id, wait)
 
-    restaurant.wait_time = wait
-    db.session.commit()
+        restaurant.wait_time = wait
+        db.session.commit()
+
+    with stage("publish"):
+        predictor.observe(rep)
+        catalog_set_wait(restaurant.id, wait)
+        refresher.touch(restaurant.id)
+        if restaurant.lat is not None and restaurant.lon is not None:
+            find_cache.invalidate_near([restaurant.lat], [restaurant.lon])
 
-    return render_template(
-        "report_thanks.html",
-        restaurant=restaurant,
-        wait=wait
+    with stage("render"):
+        return render_template(
+            "report_thanks.html",
+            restaurant=restaurant,
+            wait=wait
+        )
+
+
+# ======================= קליטת דיווחים בכמות =======================
+BULK_MAX_READINGS = 100_000
+BULK_MAX_ERRORS = 1000
+
+def _parse_bulk_body():
+    """NDJSON (שורה לכל דיווח) או מערך JSON -> [(מספר שורה, אובייקט או שגיאה)]."""
+    raw = request.get_data(cache=False, as_text=True)
+    if raw.lstrip().startswith("["):
+        items = json.loads(raw)
+        return list(enumerate(items, start=1))
+    out = []
+    for line_no, line in enumerate(raw.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            out.append((line_no, json.loads(line)))
+        except ValueError:
+            out.append((line_no, ValueError("JSON לא תקין")))
+    return out
+
+def _validate_reading(item, names, now):
+    """מחזיר (restaurant_id, wait, created_at) או מעלה ValueError עם הסבר."""
+    if isinstance(item, Exception):
+        raise item
+    if not isinstance(item, dict):
+        raise ValueError("כל דיווח צריך להיות אובייקט")
+    try:
+        if isinstance(item["wait_minutes"], bool):
+            raise TypeError
+        wait = int(item["wait_minutes"])
+    except (KeyError, TypeError, ValueError, OverflowError):
+        raise ValueError("wait_minutes חסר או לא מספר")
+    if wait < 0:
+        raise ValueError("wait_minutes שלילי")
+    if wait > MAX_REPORTED_WAIT:
+        raise ValueError(f"wait_minutes מעל {MAX_REPORTED_WAIT}")
+
+    if item.get("restaurant_id") is not None:
+        if isinstance(item["restaurant_id"], bool):
+            raise ValueError("restaurant_id לא מספר")
+        try:
+            rid = int(item["restaurant_id"])
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError("restaurant_id לא מספר")
+        if not 0 < rid < 2 ** 63:
+            raise ValueError("מסעדה לא קיימת")   # גם לא נכנס ל-int64 של הקטלוג
+    elif item.get("restaurant_name"):
+        rid = names.get(str(item["restaurant_name"]).strip().casefold())
+        if rid is None:
+            raise ValueError("מסעדה לא קיימת")
+    else:
+        raise ValueError("חסר restaurant_id או restaurant_name")
+
+    created = now
+    if item.get("created_at"):
+        try:
+            created = datetime.fromisoformat(item["created_at"])
+        except (TypeError, ValueError):
+            raise ValueError("created_at לא בפורמט ISO")
+        if created.tzinfo is not None:
+            created = created.astimezone(timezone.utc).replace(tzinfo=None)
+        if created > now + timedelta(seconds=MAX_CLOCK_SKEW_SEC):
+            raise ValueError("created_at בעתיד")
+    return rid, wait, created
+
+@app.route("/api/reports/bulk", methods=["POST"])
+def bulk_reports_api():
+    try:
+        items = _parse_bulk_body()
+    except ValueError:
+        return jsonify(error="גוף הבקשה אינו JSON / NDJSON תקין"), 400
+    if len(items) > BULK_MAX_READINGS:
+        return jsonify(error=f"עד {BULK_MAX_READINGS} דיווחים בבקשה"), 413
+
+    snap = get_catalog()
+    names = snap.name_ids()
+    now = now_utc()
+    errors = []
+    valid_lines, rids, waits, created = [], [], [], []
+
+    for line_no, item in items:
+        try:
+            rid, wait, ts = _validate_reading(item, names, now)
+        except ValueError as e:
+            errors.append({"line": line_no, "error": str(e)})
+            continue
+        valid_lines.append(line_no)
+        rids.append(rid)
+        waits.append(wait)
+        created.append(ts)
+
+    # מזהים מספריים – בדיקת קיום וקטורית מול הקטלוג
+    if rids:
+        missing = snap.positions(rids) < 0
+        if missing.any():
+            keep = ~missing
+            for line_no in np.asarray(valid_lines)[missing].tolist():
+                errors.append({"line": line_no, "error": "מסעדה לא קיימת"})
+            rids = np.asarray(rids)[keep].tolist()
+            waits = np.asarray(waits)[keep].tolist()
+            created = [c for c, k in zip(created, keep.tolist()) if k]
+
+    if rids:
+        init_report_store()
+        db.session.execute(insert(Report), [
+            {"restaurant_id": r, "wait_minutes": w, "created_at": c}
+            for r, w, c in zip(rids, waits, created)
+        ])
+
+        # wait_time = הדיווח האחרון (לפי זמן) לכל מסעדה, בפקודת UPDATE אחת
+        latest = {}
+        for r, w, c in zip(rids, waits, created):
+            if r not in latest or c >= latest[r][1]:
+                latest[r] = (w, c)
+        db.session.execute(update(Restaurant), [
+            {"id": r, "wait_time": w} for r, (w, _c) in latest.items()
+        ])
+        db.session.commit()   # group commit – הכל או כלום
+
+        catalog_set_waits(list(latest), [w for w, _c in latest.values()])
+        for rid in predictor.sync(force=True):
+            refresher.touch(rid)
+
+    errors.sort(key=lambda e: e["line"])
+    return jsonify(
+        accepted=len(rids),
+        rejected=len(errors),
+        errors=errors[:BULK_MAX_ERRORS]
     )
 
+# ======================= ייבוא / ייצוא קטלוג (CSV) =======================
+CATALOG_CSV_FIELDS = ["id", "name", "type", "lat", "lon", "contact", "available", "wait_time", "predicted_wait"]
+CATALOG_IMPORT_FIELDS = {"type", "lat", "lon", "contact", "available", "wait_time"}   # name = מפתח
+IMPORT_MAX_ROWS = 100_000
+IMPORT_BATCH_SIZE = 500       # שורות לטרנזקציה
+EXPORT_CHUNK_ROWS = 1000
+CSV_TRUE = {"1", "true", "yes", "y", "כן"}
+CSV_FALSE = {"0", "false", "no", "n", "לא"}
+
+class ImportTooLarge(Exception):
+    """הקובץ חורג מ-IMPORT_MAX_ROWS שורות."""
+
+def _csv_float(value, lo, hi, field):
+    if value == "":
+        return None
+    try:
+        v = float(value)
+    except ValueError:
+        raise ValueError(f"{field} אינו מספר")
+    if not lo <= v <= hi:
+        raise ValueError(f"{field} מחוץ לטווח")
+    return v
+
+def _validate_catalog_row(row, fields):
+    """שורת CSV -> dict לעמודות Restaurant, או ValueError עם הסבר."""
+    if None in row:
+        raise ValueError("יותר עמודות מהכותרת")
+    name = (row.get("name") or "").strip()
+    if not name:
+        raise ValueError("חסר שם מסעדה")
+    out = {"name": name}
+    for field in fields:
+        value = (row.get(field) or "").strip()
+        if field == "type":
+            out["type"] = normalize_type(value) if value else None
+        elif field == "lat":
+            out["lat"] = _csv_float(value, -90, 90, "lat")
+        elif field == "lon":
+            out["lon"] = _csv_float(value, -180, 180, "lon")
+        elif field == "contact":
+            out["contact"] = value or None
+        elif field == "available":
+            if value.lower() in CSV_TRUE or value == "":
+                out["available"] = True
+            elif value.lower() in CSV_FALSE:
+                out["available"] = False
+            else:
+                raise ValueError("available אינו ערך בוליאני")
+        elif field == "wait_time":
+            try:
+                out["wait_time"] = int(float(value)) if value else 0
+            except (ValueError, OverflowError):
+                raise ValueError("wait_time אינו מספר סופי")
+            if out["wait_time"] < 0:
+                raise ValueError("wait_time שלילי")
+            if out["wait_time"] > MAX_REPORTED_WAIT:
+                raise ValueError(f"wait_time מעל {MAX_REPORTED_WAIT}")
+    if {"lat", "lon"} <= fields and (out["lat"] is None) != (out["lon"] is None):
+        raise ValueError("lat ו-lon חייבים להופיע יחד")
+    return out
+
+def import_catalog_csv(stream):
+    """upsert לפי שם, בטרנזקציות של IMPORT_BATCH_SIZE שורות.
+
+    מתעדכנות רק העמודות שמופיעות בכותרת (id ו-predicted_wait מהייצוא
+    מתעלמים), כך שקובץ חלקי לא מאפס שדות אחרים. שם שמופיע כמה פעמים –
+    השורה האחרונה קובעת. מחזיר (נוספו, עודכנו, שגיאות).
+    """
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+    reader = csv.DictReader(stream)
+    header = {(f or "").strip() for f in reader.fieldnames or ()}
+    if "name" not in header:
+        raise ValueError("חסרה עמודת name בכותרת")
+    fields = header & CATALOG_IMPORT_FIELDS
+
+    errors = []
+    rows = {}   # name -> (line, values); dict שומר על סדר ההופעה האחרונה
+    for row in reader:
+        if reader.line_num > IMPORT_MAX_ROWS + 1:
+            raise ImportTooLarge
+        row = {(k or "").strip() if k is not None else None: v for k, v in row.items()}
+        try:
+            values = _validate_catalog_row(row, fields)
+        except ValueError as e:
+            errors.append({"line": reader.line_num, "error": str(e)})
+            continue
+        rows.pop(values["name"], None)
+        rows[values["name"]] = (reader.line_num, values)
+
+    created = updated = 0
+    items = list(rows.values())
+    for start in range(0, len(items), IMPORT_BATCH_SIZE):
+        batch = items[start:start + IMPORT_BATCH_SIZE]
+        stmt = sqlite_insert(Restaurant)
+        if fields:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Restaurant.name],
+                set_={f: stmt.excluded[f] for f in sorted(fields)}
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[Restaurant.name])
+        names = [values["name"] for _line, values in batch]
+        try:
+            # אותו מפתח כמו ה-UNIQUE (תלוי רישיות) – לספירת נוספו / עודכנו
+            existing = {n for (n,) in db.session.query(Restaurant.name).filter(Restaurant.name.in_(names))}
+            db.session.execute(stmt, [values for _line, values in batch])
+            db.session.commit()
+        except (IntegrityError, OperationalError) as e:
+            db.session.rollback()
+            reason = f"שגיאת מסד נתונים: {e.orig}"
+            errors.extend({"line": line, "error": reason} for line, _v in batch)
+            continue
+        n_new = sum(name not in existing for name in names)
+        created += n_new
+        updated += len(batch) - n_new
+
+    return created, updated, errors
+
+@app.route("/admin/import", methods=["POST"])
+def catalog_import_api():
+    upload = request.files.get("file")
+    raw = upload.stream if upload is not None else request.stream
+    try:
+        created, updated, errors = import_catalog_csv(io.TextIOWrapper(raw, encoding="utf-8-sig", newline=""))
+    except UnicodeDecodeError:
+        return jsonify(error="הקובץ אינו UTF-8"), 400
+    except csv.Error as e:
+        return jsonify(error=f"CSV לא תקין: {e}"), 400
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    except ImportTooLarge:
+        return jsonify(error=f"עד {IMPORT_MAX_ROWS} שורות בקובץ"), 413
+
+    if created or updated:
+        # גרסת קטלוג אחת לכל הייבוא; האינדקסים והמטמונים נבנים מחדש לפי הגרסה
+        write_catalog_snapshot()
+
+    errors.sort(key=lambda e: e["line"])
+    return jsonify(
+        created=created,
+        updated=updated,
+        rejected=len(errors),
+        errors=errors[:BULK_MAX_ERRORS]
+    )
+
+@app.route("/admin/export.csv")
+def catalog_export_csv():
+    """כל הקטלוג (גרסת snapshot אחת) + זמן ההמתנה החזוי, בחלקים."""
+    snap = get_catalog()
+
+    def generate():
+        buf = io.StringIO()
+        out = csv.writer(buf)
+        out.writerow(CATALOG_CSV_FIELDS)
+        for start in range(0, len(snap.id), EXPORT_CHUNK_ROWS):
+            sl = slice(start, start + EXPORT_CHUNK_ROWS)
+            predicted = refresher.waits(snap.id[sl])
+            for rid, name, type_, lat, lon, contact, avail, wait, pw in zip(
+                snap.id[sl].tolist(), snap.name[sl].tolist(), snap.type[sl].tolist(),
+                snap.lat[sl].tolist(), snap.lon[sl].tolist(), snap.contact[sl].tolist(),
+                snap.available[sl].tolist(), snap.wait_time[sl].tolist(), predicted.tolist()
+            ):
+                out.writerow([
+                    rid, name, type_,
+                    "" if math.isnan(lat) else repr(lat),
+                    "" if math.isnan(lon) else repr(lon),
+                    contact, int(avail), wait, round(pw, 1)
+                ])
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=catalog-v{snap.version}.csv"}
+    )
+
+# ======================= מדדים (Prometheus) =======================
+@app.route("/metrics")
+def metrics_page():
+    if not METRICS_ENABLED:
+        return "metrics disabled (FOODI_METRICS=0)\n", 404, {"Content-Type": "text/plain"}
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
 
 # ======================= מסך ניהול =======================
+ADMIN_PAGE_SIZE = 200
+ADMIN_MAX_PAGE_SIZE = 1000
+
 @app.route("/admin", methods=["GET", "POST"])
 def admin_page():
     if request.method == "POST":
@@ -472,27 +2486,72 @@ def admin_page():
         lat = float(request.form["lat"])
         lon = float(request.form["lon"])
 
-        db.session.add(
-            Restaurant(
-                name=name,
-                type=type_,
-                lat=lat,
-                lon=lon
-            )
+        restaurant = Restaurant(
+            name=name,
+            type=type_,
+            lat=lat,
+            lon=lon
         )
+        db.session.add(restaurant)
         db.session.commit()
+        catalog_inserted(restaurant.to_dict())
         return redirect(url_for("admin_page"))
 
-    return render_template("admin.html", restaurants=Restaurant.query.all())
+    # keyset pagination לפי id – עלות קבועה לעמוד, גם בעמודים האחרונים
+    after = request.args.get("after", 0, type=int)
+    limit = max(1, min(request.args.get("limit", ADMIN_PAGE_SIZE, type=int), ADMIN_MAX_PAGE_SIZE))
+    page = (
+        Restaurant.query
+        .filter(Restaurant.id > after)
+        .order_by(Restaurant.id)
+        .limit(limit + 1)
+        .all()
+    )
+    next_after = page[limit - 1].id if len(page) > limit else None
+    # הטבלה נשלחת לדפדפן תוך כדי רינדור
+    return stream_template(
+        "admin.html",
+        restaurants=page[:limit],
+        after=after,
+        limit=limit,
+        next_after=next_after
+    )
 
-if __name__ == "__main__":
-    with app.app_context():
-        db.create_all()
-        cleanup_types_in_db()   # ← זה קריטי
+# ======================= אתחול (פעם אחת, לפני fork) =======================
+def bootstrap():
+    """סכמה, נרמול סוגים, seed, snapshot של הקטלוג וחימום מטמונים.
 
-        if Restaurant.query.count() == 0:
-            seed_restaurants()
+    רץ פעם אחת: ב-__main__, או ב-master של gunicorn (when_ready ב-gunicorn.conf.py)
+    עם preload_app – ה-workers יורשים את המצב החם ב-fork (copy-on-write).
+    לא מפעיל threads; ה-refresher עולה בכל worker בנפרד.
+    """
+    timings = {}
+    t_all = time.perf_counter()
 
-    app.run(debug=True)
+    def step(name, fn):
+        t = time.perf_counter()
+        result = fn()
+        timings[name] = round((time.perf_counter() - t) * 1e3, 1)
+        return result
 
+    with app.app_context():
+        step("schema", db.create_all)
+        step("reports", init_report_store)
+        step("types", cleanup_types_in_db)
+        step("seed", lambda: Restaurant.query.count() == 0 and seed_restaurants())
+        step("catalog", write_catalog_snapshot)
+        step("predictor", lambda: predictor.sync(force=True))
+        step("baseline", baseline.load)
+        step("spatial", lambda: get_spatial_index().engine)
+        step("names", get_name_index)
+        step("predictions", refresher.warm)
+        step("templates", lambda: [app.jinja_env.get_template(t) for t in app.jinja_env.list_templates()])
+        db.session.remove()
+
+    timings["total"] = round((time.perf_counter() - t_all) * 1e3, 1)
+    print("[bootstrap] " + ", ".join(f"{k}={v}ms" for k, v in timings.items()))
+    return timings
 
+if __name__ == "__main__":
+    bootstrap()
+    app.run(debug=True)
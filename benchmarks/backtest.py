@@ -0,0 +1,297 @@
+"""Backtest וקטורי לפרמטרי החיזוי על היסטוריית הדיווחים.
+
+    python -m benchmarks.backtest                          # instance/foodi.db (+ ארכיון הדחיסה אם הוגדר)
+    python -m benchmarks.backtest --archive reports.csv    # CSV מ-FOODI_REPORT_ARCHIVE
+    python -m benchmarks.backtest --synthetic 2000000      # היסטוריה סינתטית (benchmarks.synth)
+    python -m benchmarks.backtest --half-lives 10,20,30,60 --windows 60,120,240 --by-hour
+
+לכל דיווח מחשבים את התחזית שה-DecayPredictor היה נותן רגע לפניו – ממוצע דועך
+של הדיווחים הקודמים לאותה מסעדה בחלון – לכל זמני מחצית-החיים בבת אחת, ומשווים
+לזמן ההמתנה שדווח בפועל. דיווח בלי קודמים בחלון מקבל DEFAULT_WAIT.
+
+שיטה (אותו טריק עוגן כמו ב-DecayPredictor, בלי לולאה על דיווחים):
+- ממיינים לפי (מסעדה, זמן) ומחלקים לסגמנטים של (מסעדה, תקופה באורך החלון W)
+- בתוך סגמנט המשקל הוא exp(λ(t - תחילת התקופה)) ∈ [1, e^{λW}] – בלי גלישה
+- הדיווחים הקודמים בחלון = כל הקודמים בסגמנט + זנב הסגמנט של התקופה הקודמת
+  (כל דיווח באותה תקופה נמצא ממילא בחלון, ותחילת החלון נופלת בתקופה הקודמת)
+- סכומים מצטברים לכל סגמנט מחושבים ב-cumsum על מטריצות מרופדות לפי מחלקת
+  אורך (חזקות 2), כך שאין ביטול בין סגמנטים; כל זמני מחצית-החיים הם ציר נוסף
+
+הערה: משקלי המרחק/המתנה בדירוג (0.7/0.3) מגדירים את פונקציית המטרה עצמה, ואין
+בהיסטוריית הדיווחים אמת-מידה לבחירת המשתמשים – ולכן הכלי מכייל רק את פרמטרי
+החיזוי (HALF_LIFE_MIN, RECENT_WINDOW_MIN, DEFAULT_WAIT).
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+DEFAULT_HALF_LIVES = (5, 10, 15, 20, 30, 45, 60, 90, 120)
+DEFAULT_WINDOWS = (60, 120, 240)
+DEFAULT_WAIT_GRID = (10, 15, 20, 25, 30, 35)
+CHUNK_ROWS = 250_000         # שורות לחלק (לא חוצים מסעדה) – חוסם את הזיכרון ב-(H, chunk)
+MAX_DECAY_EXP = 300.0        # λW – המשקלים המעוגנים מגיעים עד e^{λW}
+
+# ======================= טעינה =======================
+def load_db(path):
+    """(id, restaurant_id, wait, t_min) מטבלת reports; הזמן מומר לדקות ב-SQL."""
+    con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cur = con.execute(
+            "SELECT id, restaurant_id, wait_minutes, (julianday(created_at) - 2440587.5) * 1440.0 FROM reports"
+        )
+        rows = np.fromiter(cur, dtype=[("id", "i8"), ("rid", "i8"), ("wait", "f8"), ("t", "f8")])
+    except sqlite3.OperationalError:
+        rows = np.empty(0, dtype=[("id", "i8"), ("rid", "i8"), ("wait", "f8"), ("t", "f8")])
+    finally:
+        con.close()
+    return rows["id"], rows["rid"], rows["wait"], rows["t"]
+
+def load_archive(path):
+    """CSV של compact_reports: id,restaurant_id,wait,created_at (isoformat)."""
+    ids, rids, waits, stamps = [], [], [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split(",")
+            if len(parts) != 4:
+                continue
+            ids.append(int(parts[0]))
+            rids.append(int(parts[1]))
+            waits.append(float(parts[2]))
+            stamps.append(parts[3][:19])   # שניות מספיקות; בלי אזור זמן (UTC)
+    ts = np.array(stamps, dtype="datetime64[s]")
+    return (
+        np.array(ids, dtype=np.int64), np.array(rids, dtype=np.int64),
+        np.array(waits, dtype=np.float64), ts.astype(np.int64) / 60.0
+    )
+
+def load_history(db_path=None, archives=()):
+    """מאחד DB וארכיונים (לפי id – שורה שנדחסה לא נספרת פעמיים)."""
+    parts = []
+    if db_path and os.path.exists(db_path):
+        parts.append(load_db(db_path))
+    for path in archives:
+        parts.append(load_archive(path))
+    if not parts:
+        return np.empty(0, np.int64), np.empty(0), np.empty(0)
+    ids, rid, wait, t = (np.concatenate(cols) for cols in zip(*parts))
+    _, keep = np.unique(ids, return_index=True)
+    return rid[keep], wait[keep], t[keep]
+
+def synthetic_history(n, restaurants, days, seed):
+    from benchmarks.synth import synth_reports
+
+    rid, wait, ts = synth_reports(n, np.arange(1, restaurants + 1), days=days, seed=seed)
+    return rid, wait.astype(np.float64), ts.astype("datetime64[s]").astype(np.int64) / 60.0
+
+# ======================= חישוב וקטורי =======================
+def _segment_exclusive_cumsum(values, starts, lengths):
+    """סכום מצטבר בלעדי בתוך כל סגמנט רציף (ציר אחרון), ל-values בצורת (H, n)."""
+    out = np.empty_like(values)
+    size_class = np.ceil(np.log2(np.maximum(lengths, 1))).astype(np.int64)
+    for c in np.unique(size_class):
+        segs = np.flatnonzero(size_class == c)
+        width = 1 << int(c)
+        offs = np.arange(width)
+        valid = offs < lengths[segs, None]
+        idx = np.where(valid, starts[segs, None] + offs, 0)
+        block = np.where(valid, values[:, idx], 0.0)          # (H, segs, width)
+        excl = np.zeros_like(block)
+        np.cumsum(block[..., :-1], axis=-1, out=excl[..., 1:])
+        out[:, idx[valid]] = excl[:, valid]
+    return out
+
+def decayed_predictions(rid, t, wait, half_lives, window):
+    """תחזית leave-one-out לכל דיווח ולכל זמן מחצית-חיים.
+
+    rid / t / wait ממוינים לפי (rid, t). מחזיר (pred בצורת (H, n), n_prior):
+    n_prior = מספר הדיווחים הקודמים בחלון; איפה שהוא 0 התחזית NaN.
+    """
+    lam = np.log(2.0) / np.asarray(half_lives, dtype=np.float64)[:, None]   # (H, 1)
+    n = len(t)
+    epoch = np.floor(t / window).astype(np.int64)
+    anchor = epoch * window
+
+    boundary = np.ones(n, dtype=bool)
+    boundary[1:] = (rid[1:] != rid[:-1]) | (epoch[1:] != epoch[:-1])
+    starts = np.flatnonzero(boundary)
+    lengths = np.diff(np.append(starts, n))
+    seg = np.cumsum(boundary) - 1
+    seg_start = starts[seg]
+
+    # תחילת החלון של כל דיווח – חיפוש בינארי על מפתח (מסעדה, זמן) מונוטוני
+    rank = np.cumsum(np.r_[True, rid[1:] != rid[:-1]]) - 1
+    span = (t.max() - t.min()) + 2 * window + 1
+    key = rank * span + (t - t.min())
+    lo = np.searchsorted(key, key - window, side="left")
+    n_prior = np.arange(n) - lo
+
+    x = np.exp(lam * (t - anchor))                 # משקל מעוגן לתחילת התקופה, (H, n)
+    xw = x * wait
+    cw = _segment_exclusive_cumsum(x, starts, lengths)
+    cwm = _segment_exclusive_cumsum(xw, starts, lengths)
+
+    # זנב התקופה הקודמת (שורות lo..סוף הסגמנט הקודם): סכום הסגמנט פחות הקודמים
+    # ל-lo – ביטול מתון, כי המשקלים המעוגנים עולים בזמן. הזנב תמיד בתקופה e-1,
+    # כך שהמעבר לעוגן הנוכחי הוא exp(-λW) קבוע; exp(-λ(t - anchor)) המשותף
+    # לשני הסכומים מצטמצם במנה
+    ti = np.flatnonzero(lo < seg_start)
+    prev_end = seg_start[ti] - 1
+    j = lo[ti]
+    decay = np.exp(-lam * window)
+    cw[:, ti] += (cw[:, prev_end] + x[:, prev_end] - cw[:, j]) * decay
+    cwm[:, ti] += (cwm[:, prev_end] + xw[:, prev_end] - cwm[:, j]) * decay
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pred = cwm / cw
+    pred[:, n_prior == 0] = np.nan
+    return pred, n_prior
+
+def _chunks(rid, chunk_rows):
+    """גבולות חלקים שלא חוצים מסעדה."""
+    n = len(rid)
+    bounds = [0]
+    while bounds[-1] < n:
+        cut = min(bounds[-1] + chunk_rows, n)
+        if cut < n:
+            # מתקדמים לתחילת המסעדה הבאה
+            cut = int(np.searchsorted(rid, rid[cut - 1], side="right"))
+        bounds.append(cut)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def backtest(rid, wait, t, half_lives=DEFAULT_HALF_LIVES, windows=DEFAULT_WINDOWS,
+             default_wait=25, wait_grid=DEFAULT_WAIT_GRID, chunk_rows=CHUNK_ROWS):
+    """שגיאות לכל (חלון, מחצית-חיים) + ניתוח ברירת המחדל + שגיאה לפי שעה ביום (UTC)."""
+    order = np.lexsort((t, rid))
+    rid, wait, t = rid[order], np.asarray(wait, dtype=np.float64)[order], t[order]
+    half_lives = np.asarray(half_lives, dtype=np.float64)
+    hour = (np.floor(t / 60.0) % 24).astype(np.int64)
+    n = len(t)
+    H = len(half_lives)
+
+    results = []
+    for window in windows:
+        abs_sum = np.zeros(H)
+        sq_sum = np.zeros(H)
+        covered = 0
+        by_hour = np.zeros((H, 24))
+        hour_n = np.zeros(24)
+        uncovered = []
+        for a, b in _chunks(rid, chunk_rows):
+            pred, n_prior = decayed_predictions(rid[a:b], t[a:b], wait[a:b], half_lives, window)
+            has = n_prior > 0
+            err = np.abs(pred[:, has] - wait[a:b][has])
+            abs_sum += err.sum(axis=1)
+            sq_sum += (err ** 2).sum(axis=1)
+            covered += int(has.sum())
+            h = hour[a:b][has]
+            for i in range(H):
+                by_hour[i] += np.bincount(h, weights=err[i], minlength=24)
+            hour_n += np.bincount(h, minlength=24)
+            uncovered.append(wait[a:b][~has])
+
+        uncovered = np.concatenate(uncovered) if uncovered else np.empty(0)
+        fallback_abs = float(np.abs(uncovered - default_wait).sum())
+        fallback_grid = {
+            int(d): round(float(np.abs(uncovered - d).mean()), 3) if len(uncovered) else None
+            for d in wait_grid
+        }
+        for i, hl in enumerate(half_lives):
+            results.append({
+                "window_min": float(window),
+                "half_life_min": float(hl),
+                "coverage": round(covered / n, 4) if n else 0.0,
+                "mae_covered": round(float(abs_sum[i] / covered), 3) if covered else None,
+                "rmse_covered": round(float(np.sqrt(sq_sum[i] / covered)), 3) if covered else None,
+                "mae_all": round(float((abs_sum[i] + fallback_abs) / n), 3) if n else None,
+                "mae_by_hour": [
+                    round(float(e / c), 3) if c else None for e, c in zip(by_hour[i], hour_n)
+                ],
+                "fallback_mae": fallback_grid,
+                "fallback_median": float(np.median(uncovered)) if len(uncovered) else None,
+            })
+    return results
+
+# ======================= CLI =======================
+def _floats(text):
+    return [float(v) for v in text.split(",") if v.strip()]
+
+def main(argv=None):
+    from app import DEFAULT_WAIT, HALF_LIFE_MIN, RECENT_WINDOW_MIN
+
+    parser = argparse.ArgumentParser(description="foodi predictor backtest")
+    parser.add_argument("--db", default=os.path.join("instance", "foodi.db"))
+    parser.add_argument("--archive", action="append", default=[],
+                        help="CSV של ארכיון הדחיסה (אפשר כמה פעמים)")
+    parser.add_argument("--synthetic", type=int, help="מספר דיווחים סינתטיים במקום DB")
+    parser.add_argument("--restaurants", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--half-lives", type=_floats, default=list(DEFAULT_HALF_LIVES))
+    parser.add_argument("--windows", type=_floats, default=list(DEFAULT_WINDOWS))
+    parser.add_argument("--default-wait", type=float, default=DEFAULT_WAIT)
+    parser.add_argument("--by-hour", action="store_true", help="שגיאה לפי שעה ביום להגדרה הנוכחית והטובה")
+    parser.add_argument("--out", help="כתיבת התוצאות כ-JSON")
+    args = parser.parse_args(argv)
+
+    half_lives = sorted(set(args.half_lives) | {HALF_LIFE_MIN})
+    windows = sorted(set(args.windows) | {RECENT_WINDOW_MIN})
+    if min(half_lives) <= 0 or min(windows) <= 0:
+        parser.error("half-lives / windows חייבים להיות חיוביים")
+    if np.log(2.0) / min(half_lives) * max(windows) > MAX_DECAY_EXP:
+        parser.error("מחצית-חיים קצרה מדי ביחס לחלון (exp יגלוש)")
+
+    t0 = time.perf_counter()
+    if args.synthetic:
+        rid, wait, t = synthetic_history(args.synthetic, args.restaurants, args.days, args.seed)
+        source = f"synthetic n={args.synthetic} restaurants={args.restaurants} days={args.days}"
+    else:
+        archives = args.archive or ([os.environ["FOODI_REPORT_ARCHIVE"]]
+                                    if os.path.exists(os.environ.get("FOODI_REPORT_ARCHIVE", "")) else [])
+        rid, wait, t = load_history(args.db, archives)
+        source = " + ".join([args.db] + archives)
+    t_load = time.perf_counter() - t0
+    if not len(t):
+        print(f"no reports in {source}")
+        return 1
+
+    t0 = time.perf_counter()
+    results = backtest(rid, wait, t, half_lives, windows, args.default_wait)
+    t_run = time.perf_counter() - t0
+
+    print(f"source: {source}")
+    print(f"reports={len(t)}  load={t_load:.2f}s  backtest={t_run:.2f}s "
+          f"({len(t) * len(half_lives) * len(windows) / max(t_run, 1e-9) / 1e6:.1f}M predictions/s)")
+    print(f"{'window':>8}{'half-life':>11}{'coverage':>10}{'MAE':>9}{'RMSE':>9}{'MAE all':>10}")
+    best = min(results, key=lambda r: r["mae_all"])
+    current = next(r for r in results
+                   if r["window_min"] == RECENT_WINDOW_MIN and r["half_life_min"] == HALF_LIFE_MIN)
+    for r in results:
+        mark = " *" if r is best else ("  (current)" if r is current else "")
+        print(f"{r['window_min']:>8g}{r['half_life_min']:>11g}{r['coverage']:>10.3f}"
+              f"{r['mae_covered'] or 0:>9.2f}{r['rmse_covered'] or 0:>9.2f}{r['mae_all']:>10.3f}{mark}")
+
+    print(f"\nbest: window={best['window_min']:g} half_life={best['half_life_min']:g} "
+          f"MAE={best['mae_all']:.3f} (current {current['mae_all']:.3f})")
+    print(f"DEFAULT_WAIT (reports without history, window={best['window_min']:g}): "
+          + ", ".join(f"{d}->{e}" for d, e in best["fallback_mae"].items())
+          + f"; median={best['fallback_median']}")
+
+    if args.by_hour:
+        print(f"\n{'hour UTC':>8}{'current':>10}{'best':>10}")
+        for h in range(24):
+            cur, bst = current["mae_by_hour"][h], best["mae_by_hour"][h]
+            print(f"{h:>8}{cur if cur is not None else '-':>10}{bst if bst is not None else '-':>10}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"source": source, "reports": int(len(t)), "results": results}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""בנצ'מרקים ל-/find, /results, /report ולפונקציות החמות בבידוד.
+
+    python -m benchmarks.run                       # פרופיל small
+    python -m benchmarks.run --profile medium
+    python -m benchmarks.run --save-baseline       # מעדכן את benchmarks/baseline.json
+    python -m benchmarks.run --check               # יוצא עם 1 אם יש רגרסיה מול ה-baseline
+
+כל הרצה בונה DB זמני (FOODI_INSTANCE_PATH) עם קטלוג ודיווחים סינתטיים,
+כך שה-DB האמיתי לא נוגע.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+PROFILES = {
+    # שם: (מסעדות, דיווחים, חזרות לכל בנצ'מרק)
+    "small": (1_000, 10_000, 300),
+    "medium": (10_000, 1_000_000, 300),
+    "large": (100_000, 10_000_000, 200),
+}
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+REGRESSION_TOLERANCE = 1.5   # פי כמה מותר ל-p50 להיות איטי מה-baseline (רעש בין מכונות)
+P99_TOLERANCE_FACTOR = 2.0   # הזנב רועש יותר – ל-p99 מותר פי tolerance * 2
+WARMUP = 10
+
+def measure(fn, iterations):
+    """מריץ fn ומחזיר p50/p99 במילישניות ותפוקה (פעולות לשנייה)."""
+    for _ in range(WARMUP):
+        fn()
+    samples = np.empty(iterations)
+    start = time.perf_counter()
+    for i in range(iterations):
+        t = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - t
+    total = time.perf_counter() - start
+    return {
+        "p50_ms": round(float(np.percentile(samples, 50)) * 1e3, 4),
+        "p99_ms": round(float(np.percentile(samples, 99)) * 1e3, 4),
+        "ops_per_sec": round(iterations / total, 1),
+    }
+
+def setup(profile, seed):
+    n_rest, n_reports, _ = PROFILES[profile]
+    workdir = tempfile.mkdtemp(prefix="foodi-bench-")
+    os.environ["FOODI_INSTANCE_PATH"] = workdir
+    os.chdir(workdir)   # בלי reports.json להעברה
+
+    from app import app, db, init_report_store, write_catalog_snapshot, Restaurant
+    from benchmarks.synth import synth_catalog, synth_reports, load_into_db
+
+    with app.app_context():
+        db.create_all()
+        init_report_store()
+        db_path = db.engine.url.database
+        catalog = synth_catalog(n_rest, seed=seed)
+        load_into_db(db_path, catalog, ([], [], np.array([], dtype="datetime64[s]")))
+        ids = np.array([i for (i,) in db.session.query(Restaurant.id).order_by(Restaurant.id)])
+        load_into_db(db_path, [], synth_reports(n_reports, ids, seed=seed))
+        write_catalog_snapshot()
+    return app, ids
+
+def run(profile, seed=0):
+    app, ids = setup(profile, seed)   # קודם FOODI_INSTANCE_PATH, ורק אז import של app
+
+    from app import (
+        db, haversine, weighted_prediction_for_restaurant,
+        hungarian_top_k_restaurants_for_client, load_restaurants, predictor,
+    )
+    from benchmarks.synth import CITY_CENTERS, CITY_SPREAD_DEG
+
+    iterations = PROFILES[profile][2]
+    rng = np.random.default_rng(seed + 1)
+    results = {}
+
+    def random_point():
+        lat, lon, _ = CITY_CENTERS[rng.integers(len(CITY_CENTERS))]
+        return lat + rng.normal(0, CITY_SPREAD_DEG), lon + rng.normal(0, CITY_SPREAD_DEG)
+
+    with app.app_context():
+        restaurants = load_restaurants()
+        predictor.sync(force=True)
+
+        # ---------- בבידוד ----------
+        pts = [random_point() for _ in range(64)]
+        results["haversine"] = measure(
+            lambda: haversine(*pts[rng.integers(64)], *pts[rng.integers(64)]), iterations * 10
+        )
+        results["weighted_prediction"] = measure(
+            lambda: weighted_prediction_for_restaurant(restaurants[rng.integers(len(restaurants))]),
+            iterations * 10
+        )
+        ranked_input = [dict(r, predicted_wait=float(rng.uniform(0, 60))) for r in restaurants]
+        results["hungarian_top_k"] = measure(
+            lambda: hungarian_top_k_restaurants_for_client(*random_point(), ranked_input, k=5),
+            iterations
+        )
+
+        # ---------- דרך האפליקציה ----------
+        client = app.test_client()
+
+        def find():
+            lat, lon = random_point()
+            assert client.get(f"/find?lat={lat}&lon={lon}").status_code == 200
+
+        def api_find():
+            lat, lon = random_point()
+            assert client.get(f"/api/find?lat={lat}&lon={lon}").status_code == 200
+
+        def results_page():
+            assert client.get("/results").status_code == 200
+
+        def report():
+            rid = int(ids[rng.integers(len(ids))])
+            r = client.post("/report", data={"restaurant_id": rid, "wait_minutes": int(rng.integers(0, 60))})
+            assert r.status_code == 200
+
+        results["GET /find"] = measure(find, iterations)
+        results["GET /api/find"] = measure(api_find, iterations)
+        results["GET /results"] = measure(results_page, max(iterations // 10, 10))
+        results["POST /report"] = measure(report, iterations)
+        db.session.remove()
+
+    return results
+
+def check(profile, results, tolerance=REGRESSION_TOLERANCE):
+    """משווה p50/p99 מול ה-baseline; מחזיר רשימת רגרסיות."""
+    try:
+        with open(BASELINE, encoding="utf-8") as f:
+            baseline = json.load(f).get(profile, {})
+    except FileNotFoundError:
+        return []
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key, limit in (("p50_ms", tolerance), ("p99_ms", tolerance * P99_TOLERANCE_FACTOR)):
+            if base[key] > 0 and cur[key] > base[key] * limit:
+                regressions.append(f"{name} {key}: {cur[key]} > {base[key]} x {limit}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="foodi benchmarks")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--out", help="כתיבת התוצאות כ-JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.profile, args.seed)
+
+    print(f"profile={args.profile}")
+    print(f"{'benchmark':<22}{'p50 ms':>12}{'p99 ms':>12}{'ops/s':>14}")
+    for name, r in results.items():
+        print(f"{name:<22}{r['p50_ms']:>12.4f}{r['p99_ms']:>12.4f}{r['ops_per_sec']:>14.1f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({args.profile: results}, f, indent=2)
+
+    if args.save_baseline:
+        try:
+            with open(BASELINE, encoding="utf-8") as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            baseline = {}
+        baseline[args.profile] = results
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline saved -> {BASELINE}")
+
+    if args.check:
+        regressions = check(args.profile, results, args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""זמן עלייה: import של app, bootstrap() ובקשה ראשונה – כל אחד בתהליך נקי.
+
+    python -m benchmarks.startup
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+PROBE = r"""
+import json, os, sys, time
+t = time.perf_counter()
+import app as foodi
+imported = time.perf_counter() - t
+timings = foodi.bootstrap()
+client = foodi.app.test_client()
+first = {}
+for url in ("/find?lat=31.78&lon=35.21", "/results", "/report"):
+    t = time.perf_counter()
+    assert client.get(url).status_code == 200
+    first[url] = round((time.perf_counter() - t) * 1e3, 1)
+print(json.dumps({"import_ms": round(imported * 1e3, 1), "bootstrap_ms": timings, "first_request_ms": first}))
+"""
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, FOODI_INSTANCE_PATH=tempfile.mkdtemp(prefix="foodi-startup-"))
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", PROBE],
+        cwd=tempfile.mkdtemp(prefix="foodi-cwd-"), env=dict(env, PYTHONPATH=root),
+        capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""מחוללים סינתטיים לקטלוג מסעדות ולהיסטוריית דיווחים (לבנצ'מרקים).
+
+הכל דטרמיניסטי לפי seed, כדי שהשוואה מול baseline תהיה הוגנת.
+"""
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+
+# מרכזי ערים (lat, lon, משקל) – רוב המסעדות מתרכזות בכמה אזורים צפופים
+CITY_CENTERS = [
+    (31.7784, 35.2066, 0.35),   # ירושלים
+    (32.0853, 34.7818, 0.40),   # תל אביב
+    (32.7940, 34.9896, 0.15),   # חיפה
+    (31.2518, 34.7913, 0.10),   # באר שבע
+]
+CITY_SPREAD_DEG = 0.03
+
+# שעות עומס (UTC) – צהריים וערב בישראל
+PEAK_HOURS_UTC = (10, 17)
+
+def synth_catalog(n, seed=0, raw_types=None):
+    """n מסעדות: שמות ייחודיים, סוגים (כולל כינויים לא מנורמלים) ומיקום סביב מרכזי ערים."""
+    from app import TYPE_CANONICAL
+
+    rng = np.random.default_rng(seed)
+    raw_types = raw_types or sorted(TYPE_CANONICAL)
+    weights = np.array([w for _, _, w in CITY_CENTERS])
+    city = rng.choice(len(CITY_CENTERS), size=n, p=weights / weights.sum())
+    centers = np.array([(lat, lon) for lat, lon, _ in CITY_CENTERS])
+    coords = centers[city] + rng.normal(0.0, CITY_SPREAD_DEG, size=(n, 2))
+    types = rng.choice(raw_types, size=n)
+    return [
+        {"name": f"bench-{i}", "type": str(t), "lat": float(lat), "lon": float(lon)}
+        for i, (t, (lat, lon)) in enumerate(zip(types, coords))
+    ]
+
+def synth_reports(n, restaurant_ids, now=None, days=30, seed=0):
+    """n דיווחים כמערכים (restaurant_id, wait_minutes, created_at).
+
+    - פופולריות לפי Zipf: מעט מסעדות מקבלות את רוב הדיווחים
+    - הזמן מוטה לעבר "עכשיו" ולשעות העומס
+    - ההמתנה תלויה בשעה ובמסעדה, עם רעש log-normal ומעט דיווחים חריגים
+    """
+    rng = np.random.default_rng(seed)
+    now = now or datetime.utcnow()
+    ids = np.asarray(restaurant_ids)
+
+    popular = rng.permutation(ids)
+    rank = np.minimum(rng.zipf(1.3, size=n) - 1, len(ids) - 1)
+    rid = popular[rank]
+
+    # גיל הדיווח בדקות: אקספוננציאלי (יותר דיווחים טריים) חתוך ל-days
+    horizon = days * 24 * 60
+    age = np.minimum(rng.exponential(horizon / 4, size=n), horizon)
+    # הזזה לשעת העומס הקרובה לחלק מהדיווחים
+    ts = np.datetime64(now, "s") - (age * 60).astype("timedelta64[s]")
+    hour = ((ts - ts.astype("datetime64[D]")).astype("timedelta64[h]").astype(int))
+    peak = np.isin(hour, [h + d for h in PEAK_HOURS_UTC for d in (-1, 0, 1)])
+
+    base = 8 + (rid % 7) * 3 + np.where(peak, 15, 0)
+    wait = base * rng.lognormal(0.0, 0.35, size=n)
+    trolls = rng.random(n) < 0.01
+    wait[trolls] = 60 + rng.integers(0, 60, size=trolls.sum())
+    wait = np.clip(np.rint(wait), 0, 180).astype(np.int64)
+
+    order = np.argsort(ts, kind="stable")
+    return rid[order], wait[order], ts[order]
+
+def load_into_db(db_path, catalog, reports, batch=100_000):
+    """טעינה ישירה ב-sqlite3 (executemany) – מהיר בהרבה מה-ORM לעשרות מיליוני שורות."""
+    from app import normalize_type
+
+    con = sqlite3.connect(db_path)
+    con.executemany(
+        "INSERT INTO restaurants (name, type, lat, lon, available, wait_time) VALUES (?, ?, ?, ?, 1, 0)",
+        [(r["name"], normalize_type(r["type"]), r["lat"], r["lon"]) for r in catalog]
+    )
+    rid, wait, ts = reports
+    stamps = ts.astype("datetime64[us]").astype(str)
+    for lo in range(0, len(rid), batch):
+        con.executemany(
+            "INSERT INTO reports (restaurant_id, wait_minutes, created_at) VALUES (?, ?, ?)",
+            zip(rid[lo:lo + batch].tolist(), wait[lo:lo + batch].tolist(),
+                (s.replace("T", " ") for s in stamps[lo:lo + batch].tolist()))
+        )
+    con.commit()
+    con.close()
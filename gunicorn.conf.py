@@ -0,0 +1,22 @@
+# הגדרות gunicorn: preload + אתחול אחד ב-master, ואז fork ל-workers חמים
+import os
+
+preload_app = True
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = os.environ.get("FOODI_WORKER_CLASS", "gevent")
+worker_connections = 2000   # חיבורי SSE פתוחים לכל worker
+
+if worker_class == "gevent":
+    # חייב לקרות לפני שה-app נטען ב-master, אחרת ה-locks שנוצרים ב-import אינם של gevent
+    from gevent import monkey
+    monkey.patch_all()
+
+def when_ready(server):
+    from app import bootstrap
+    bootstrap()
+
+def post_fork(server, worker):
+    # חיבורי DB שנפתחו ב-master לא עוברים fork – כל worker פותח pool משלו
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)